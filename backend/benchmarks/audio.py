@@ -0,0 +1,96 @@
+import numpy as np
+import soundfile as sf
+
+WORDS = (
+    "the model learns a function from examples and we measure how well it "
+    "generalises to data it has never seen before so the lecture covers "
+    "gradient descent loss surfaces regularisation and why validation sets "
+    "matter when tuning hyperparameters for a neural network in practice"
+).split()
+
+
+def generate_speech_like_audio(duration: float, sample_rate: int = 44100,
+                               channels: int = 2, seed: int = 0) -> np.ndarray:
+    """
+    Generate synthetic audio with the rough structure of speech.
+
+    The signal is a sequence of voiced "syllables" (a glottal-like harmonic
+    series shaped by two formants), short unvoiced noise bursts and pauses
+    between phrases, so Whisper and the resampler see realistic spectra and
+    energy envelopes without needing a recorded corpus.
+
+    Args:
+        duration (float): Length of the clip in seconds
+        sample_rate (int): Output sample rate in Hz
+        channels (int): Number of output channels (1 or 2)
+        seed (int): Random seed so runs are reproducible
+
+    Returns:
+        np.ndarray: float32 samples, shape (n,) or (n, channels)
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration * sample_rate)
+    audio = np.zeros(total, dtype=np.float32)
+
+    pos = 0
+    while pos < total:
+        # A phrase is 3-12 syllables followed by a pause
+        for _ in range(int(rng.integers(3, 13))):
+            length = int(rng.uniform(0.08, 0.25) * sample_rate)
+            if pos + length >= total:
+                break
+            t = np.arange(length) / sample_rate
+            envelope = np.hanning(length)
+
+            if rng.random() < 0.2:
+                # Unvoiced consonant: band-limited noise
+                segment = rng.standard_normal(length) * 0.15
+                segment = np.convolve(segment, np.ones(4) / 4, mode="same")
+            else:
+                f0 = rng.uniform(100, 220) * (1 + 0.02 * np.sin(2 * np.pi * 5 * t))
+                phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+                formant1 = rng.uniform(300, 900)
+                formant2 = rng.uniform(900, 2500)
+                segment = np.zeros(length)
+                for harmonic in range(1, 30):
+                    freq = f0.mean() * harmonic
+                    if freq >= sample_rate / 2:
+                        break
+                    gain = (np.exp(-((freq - formant1) / 200) ** 2)
+                            + 0.6 * np.exp(-((freq - formant2) / 300) ** 2)
+                            + 0.05 / harmonic)
+                    segment += gain * np.sin(harmonic * phase)
+                segment *= 0.3 / max(np.max(np.abs(segment)), 1e-6)
+
+            audio[pos:pos + length] = segment * envelope
+            pos += length + int(rng.uniform(0.01, 0.05) * sample_rate)
+        pos += int(rng.uniform(0.2, 0.8) * sample_rate)
+
+    # Low-level room noise so silence is not digitally perfect
+    audio += rng.standard_normal(total).astype(np.float32) * 0.002
+
+    if channels == 1:
+        return audio
+    return np.stack([audio] * channels, axis=1)
+
+
+def write_speech_like_audio(path: str, duration: float, sample_rate: int = 44100,
+                            channels: int = 2, seed: int = 0) -> str:
+    """Write a synthetic speech-like clip to `path` as 16-bit WAV."""
+    audio = generate_speech_like_audio(duration, sample_rate, channels, seed)
+    sf.write(path, audio, sample_rate, subtype="PCM_16", format="WAV")
+    return path
+
+
+def generate_transcript(duration: float, words_per_minute: int = 150, seed: int = 0) -> str:
+    """Generate filler transcript text with roughly as many words as `duration` of speech."""
+    rng = np.random.default_rng(seed)
+    count = max(1, int(duration / 60 * words_per_minute))
+    sentences = []
+    remaining = count
+    while remaining > 0:
+        length = min(remaining, int(rng.integers(8, 25)))
+        words = [WORDS[i] for i in rng.integers(0, len(WORDS), length)]
+        sentences.append(" ".join(words).capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
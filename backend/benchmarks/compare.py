@@ -0,0 +1,60 @@
+"""
+Compare two benchmark result files produced by `benchmarks.run`.
+
+Usage (from the backend directory):
+    python -m benchmarks.compare baseline.json candidate.json --fail-above 10
+"""
+import argparse
+import json
+import sys
+
+METRICS = [
+    ("p50 ms", lambda s: s["latency_ms"]["p50"]),
+    ("p99 ms", lambda s: s["latency_ms"]["p99"]),
+    ("peak MiB", lambda s: s["peak_rss_mb"]),
+    ("RTF", lambda s: s.get("real_time_factor")),
+]
+
+
+def compare(baseline: dict, candidate: dict) -> list:
+    """Return (stage, metric, before, after, change_pct) rows for stages present in both runs."""
+    rows = []
+    for stage, before in baseline["stages"].items():
+        after = candidate["stages"].get(stage)
+        if not after or before.get("status") != "ok" or after.get("status") != "ok":
+            continue
+        for metric, getter in METRICS:
+            old, new = getter(before), getter(after)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            rows.append((stage, metric, old, new, change))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--fail-above", type=float, default=None,
+                        help="exit non-zero if any metric regresses by more than this percentage")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = json.load(f)
+
+    rows = compare(baseline, candidate)
+    width = max([len("stage")] + [len(row[0]) for row in rows])
+    print(f"{'stage':<{width}} {'metric':<9} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for stage, metric, old, new, change in rows:
+        precision = 3 if metric == "RTF" else 1
+        print(f"{stage:<{width}} {metric:<9} {old:>12.{precision}f} {new:>12.{precision}f} {change:>+8.1f}%")
+
+    if args.fail_above is not None and any(change > args.fail_above for *_, change in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
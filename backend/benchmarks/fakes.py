@@ -0,0 +1,154 @@
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _sleep(latency: float, jitter: float):
+    """Sleep for `latency` seconds +/- up to `jitter` seconds."""
+    delay = latency + random.uniform(-jitter, jitter) if jitter else latency
+    if delay > 0:
+        time.sleep(delay)
+
+
+def make_fake_yt_dlp(audio_source: str, latency: float = 0.0, jitter: float = 0.0,
+                     duration: float = 60.0) -> types.ModuleType:
+    """
+    Build a stand-in for the `yt_dlp` module.
+
+    `YoutubeDL.download` sleeps for the configured latency and then copies
+    `audio_source` to where the FFmpegExtractAudio postprocessor would have
+    left the MP3, so `download_audio` follows its normal success path.
+    """
+    module = types.ModuleType("yt_dlp")
+
+    class YoutubeDL:
+        def __init__(self, params=None):
+            self.params = params or {}
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def extract_info(self, url, download=True):
+            _sleep(latency, jitter)
+            video_id = url.rsplit("=", 1)[-1].rsplit("/", 1)[-1]
+            info = {
+                "id": video_id,
+                "title": f"Synthetic lecture {video_id}",
+                "duration": duration,
+                "language": "en",
+                "subtitles": {},
+                "automatic_captions": {},
+            }
+            if download:
+                self.download([url])
+            return info
+
+        def download(self, urls):
+            _sleep(latency, jitter)
+            outtmpl = self.params.get("outtmpl", "download")
+            if isinstance(outtmpl, dict):
+                outtmpl = outtmpl.get("default", "download")
+            shutil.copyfile(audio_source, f"{outtmpl}.mp3")
+            return 0
+
+    module.YoutubeDL = YoutubeDL
+    return module
+
+
+def make_fake_deep_translator(latency: float = 0.0, jitter: float = 0.0) -> types.ModuleType:
+    """Build a stand-in for `deep_translator` whose GoogleTranslator echoes its input."""
+    module = types.ModuleType("deep_translator")
+
+    class GoogleTranslator:
+        def __init__(self, source="auto", target="en", **kwargs):
+            self.source = source
+            self.target = target
+
+        def translate(self, text, **kwargs):
+            _sleep(latency, jitter)
+            return text
+
+    module.GoogleTranslator = GoogleTranslator
+    return module
+
+
+class FakeOpenRouter:
+    """Local HTTP server that answers OpenRouter chat completion calls after a delay."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                prompt = json.loads(body)["messages"][-1]["content"]
+                server.requests += 1
+                _sleep(server.latency, server.jitter)
+
+                # Roughly one bullet per 400 prompt characters, like a real summary
+                bullets = "\n".join(f"-- Key point {i + 1}" for i in range(max(3, len(prompt) // 400)))
+                content = f"### Section 1: Overview\n## Key Concepts\n{bullets}\n"
+                payload = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def install_fakes(config: dict) -> FakeOpenRouter:
+    """
+    Replace yt-dlp, GoogleTranslator and OpenRouter with local fakes.
+
+    Must run before any `services.*` module is imported so the fakes are
+    what those modules bind to.
+
+    Args:
+        config (dict): Benchmark config with `audio_path`, `duration` and
+            `{download,translate,llm}_latency` / `jitter` keys
+
+    Returns:
+        FakeOpenRouter: The running fake server (call `stop()` when done)
+    """
+    jitter = config.get("jitter", 0.0)
+    sys.modules["yt_dlp"] = make_fake_yt_dlp(
+        config["audio_path"], config.get("download_latency", 0.0), jitter, config.get("duration", 60.0)
+    )
+    sys.modules["deep_translator"] = make_fake_deep_translator(config.get("translate_latency", 0.0), jitter)
+
+    openrouter = FakeOpenRouter(config.get("llm_latency", 0.0), jitter).start()
+    os.environ["OPENROUTER_API_KEY"] = "benchmark"
+    os.environ["OPENROUTER_BASE_URL"] = openrouter.base_url
+    return openrouter
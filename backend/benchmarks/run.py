@@ -0,0 +1,332 @@
+"""
+Offline end-to-end benchmark for the notes pipeline.
+
+Generates synthetic speech-like audio, replaces yt-dlp, GoogleTranslator and
+OpenRouter with local fakes of configurable latency, then times every stage
+(plus the full `process_video` path) in its own subprocess so peak RSS is
+attributable to that stage. Results are written as JSON for later comparison
+with `python -m benchmarks.compare`.
+
+Stages that transcribe run once per backend in --backends; results for
+backends other than whisper are keyed `<stage>[<backend>]`.
+
+Usage (from the backend directory):
+    python -m benchmarks.run --duration 120 --iterations 5 --llm-latency 1.5
+    python -m benchmarks.run --stages transcribe_audio --backends whisper faster-whisper
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+STAGES = [
+    "transcribe_audio",
+    "split_text",
+    "translate_text",
+    "generate_notes",
+    "create_pdf",
+    "read_transcript",
+    "process_video",
+]
+
+# Stages whose cost depends on the transcription backend
+BACKEND_STAGES = ("transcribe_audio", "process_video")
+
+
+def percentile(values: list, pct: float) -> float:
+    """Linear-interpolated percentile of `values` (pct in 0-100)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb() -> float:
+    """Current resident set size of this process in MiB (Linux only, else peak)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return peak_rss_mb()
+
+
+def _setup_stage(name: str, config: dict):
+    """
+    Prepare one stage and return (operation, teardown, units, unit_name).
+
+    `operation(i)` runs the stage once (sync or coroutine), `teardown(i)`
+    removes whatever that iteration produced and is not timed.
+    """
+    from benchmarks.audio import generate_transcript
+
+    duration = config["duration"]
+    transcript = generate_transcript(duration, seed=config["seed"])
+    noop = lambda i: None
+
+    if name == "transcribe_audio":
+        from services.transcription import transcribe_audio
+        return (lambda i: transcribe_audio(config["audio_path"], config["model_size"], config["backend"]),
+                noop, duration, "audio_seconds")
+
+    if name == "split_text":
+        from services.translation import split_text
+        return lambda i: split_text(transcript), noop, len(transcript), "chars"
+
+    if name == "translate_text":
+        from services.translation import translate_text
+        return (lambda i: translate_text(transcript, config["target_language"]),
+                noop, len(transcript), "chars")
+
+    if name == "generate_notes":
+        from services.notes import generate_notes
+        return lambda i: generate_notes(transcript, "en"), noop, len(transcript), "chars"
+
+    if name == "create_pdf":
+        from services.pdf import create_pdf
+        from services.file_manager import file_manager
+        file_manager.start(with_scheduler=False)
+        bullets = "\n".join(f"-- {sentence.strip()}" for sentence in transcript.split(".") if sentence.strip())
+        notes = f"### Section 1: Overview\n## Key Concepts\n{bullets}\n"
+        return (lambda i: create_pdf(notes, f"bench_pdf_{i}"),
+                lambda i: file_manager.cleanup_files(f"bench_pdf_{i}"),
+                len(notes), "chars")
+
+    if name == "read_transcript":
+        from services.pipeline import read_transcript
+        path = os.path.join(config["workdir"], "bench_transcript.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(transcript)
+        return lambda i: read_transcript(path), noop, len(transcript), "chars"
+
+    if name == "process_video":
+        from main import process_video, TranscriptRequest
+        from starlette.requests import Request
+        from services.file_manager import file_manager
+        from services import runtime
+        # In-process queue workers, as in the default single-node deployment
+        runtime.startup("all")
+
+        async def receive():
+            # The client never disconnects
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        def run(i):
+            request = TranscriptRequest(
+                youtube_url=f"https://www.youtube.com/watch?v=bench{i:05d}",
+                model_size=config["model_size"],
+                target_language=config["target_language"],
+                transcription_backend=config["backend"],
+            )
+            http_request = Request({"type": "http", "headers": [], "client": ("127.0.0.1", 0)}, receive)
+            return process_video(request, http_request)
+
+        return run, lambda i: file_manager.cleanup_files(f"bench{i:05d}"), duration, "audio_seconds"
+
+    raise ValueError(f"Unknown stage: {name}")
+
+
+def measure_stage(name: str, config: dict) -> dict:
+    """Run one stage `warmup + iterations` times and summarise the timed runs."""
+    operation, teardown, units, unit_name = _setup_stage(name, config)
+    loop = asyncio.new_event_loop()
+
+    def call(i):
+        result = operation(i)
+        if inspect.isawaitable(result):
+            result = loop.run_until_complete(result)
+        return result
+
+    for i in range(config["warmup"]):
+        call(-1 - i)
+        teardown(-1 - i)
+
+    rss_before = current_rss_mb()
+    latencies = []
+    for i in range(config["iterations"]):
+        start = time.perf_counter()
+        call(i)
+        latencies.append(time.perf_counter() - start)
+        teardown(i)
+    loop.close()
+
+    total = sum(latencies)
+    summary = {
+        "status": "ok",
+        "iterations": len(latencies),
+        "latency_ms": {
+            "min": min(latencies) * 1000,
+            "mean": total / len(latencies) * 1000,
+            "p50": percentile(latencies, 50) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+        },
+        "throughput": {
+            "ops_per_second": len(latencies) / total if total else 0.0,
+            f"{unit_name}_per_second": units * len(latencies) / total if total else 0.0,
+        },
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if unit_name == "audio_seconds":
+        # Processing time per second of audio: below 1 is faster than real time
+        summary["real_time_factor"] = total / len(latencies) / units
+    return summary
+
+
+def _stage_worker(name: str, config: dict, conn):
+    """Subprocess entry point: install fakes, run one stage, send back the summary."""
+    os.chdir(config["workdir"])
+    sys.path.insert(0, BACKEND_DIR)
+
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    from benchmarks.fakes import install_fakes
+    openrouter = install_fakes(config)
+    try:
+        result = measure_stage(name, config)
+    except ImportError as e:
+        result = {"status": "skipped", "reason": f"missing dependency: {e}"}
+    except Exception as e:
+        result = {"status": "error", "reason": str(e)}
+    finally:
+        openrouter.stop()
+    result["llm_requests"] = openrouter.requests
+    conn.send(result)
+    conn.close()
+
+
+def run_stage_isolated(name: str, config: dict) -> dict:
+    """Run a stage in a fresh interpreter so imports and peak RSS are not shared."""
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_stage_worker, args=(name, config, child))
+    process.start()
+    child.close()
+    try:
+        result = parent.recv()
+    except EOFError:
+        result = {"status": "error", "reason": f"stage process exited with code {process.exitcode}"}
+    process.join()
+    return result
+
+
+def git_commit() -> str:
+    """Current git commit of the tree being benchmarked, if available."""
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for the notes pipeline")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--duration", type=float, default=60.0, help="synthetic audio length in seconds")
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--model-size", default="tiny")
+    parser.add_argument("--backends", nargs="+", default=["whisper"],
+                        help="transcription backends to compare (see services/transcription.py)")
+    parser.add_argument("--target-language", default="es")
+    parser.add_argument("--download-latency", type=float, default=0.5, help="fake yt-dlp latency (s)")
+    parser.add_argument("--translate-latency", type=float, default=0.2, help="fake translator latency per chunk (s)")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="fake OpenRouter latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- jitter applied to fake latencies (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON output path (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    from benchmarks.audio import write_speech_like_audio
+
+    with tempfile.TemporaryDirectory(prefix="voxtora-bench-") as workdir:
+        audio_path = write_speech_like_audio(
+            os.path.join(workdir, "synthetic.wav"), args.duration, args.sample_rate, seed=args.seed
+        )
+        config = {
+            "workdir": workdir,
+            "audio_path": audio_path,
+            "duration": args.duration,
+            "sample_rate": args.sample_rate,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+            "model_size": args.model_size,
+            "backends": args.backends,
+            "target_language": args.target_language,
+            "download_latency": args.download_latency,
+            "translate_latency": args.translate_latency,
+            "llm_latency": args.llm_latency,
+            "jitter": args.jitter,
+            "seed": args.seed,
+        }
+
+        runs = []
+        for name in args.stages:
+            backends = args.backends if name in BACKEND_STAGES else args.backends[:1]
+            for backend in backends:
+                key = name if backend == "whisper" or name not in BACKEND_STAGES else f"{name}[{backend}]"
+                runs.append((key, name, backend))
+
+        stages = {}
+        for key, name, backend in runs:
+            print(f"[bench] {key} ...", flush=True)
+            stages[key] = run_stage_isolated(name, {**config, "backend": backend})
+            summary = stages[key]
+            if summary["status"] == "ok":
+                rtf = f" rtf={summary['real_time_factor']:.3f}" if "real_time_factor" in summary else ""
+                print(f"[bench] {key}: p50={summary['latency_ms']['p50']:.1f}ms "
+                      f"p99={summary['latency_ms']['p99']:.1f}ms peak_rss={summary['peak_rss_mb']:.0f}MiB{rtf}")
+            else:
+                print(f"[bench] {key}: {summary['status']} ({summary['reason']})")
+
+    report = {
+        "schema": 1,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {k: v for k, v in config.items() if k not in ("workdir", "audio_path")},
+        "stages": stages,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[bench] results written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
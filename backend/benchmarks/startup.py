@@ -0,0 +1,120 @@
+"""
+Startup benchmark: how long a fresh process takes to import `main` and run
+the app lifespan, and which heavy dependencies that pulls in.
+
+Usage (from the backend directory):
+    python -m benchmarks.startup --role api --runs 10
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from benchmarks.run import BACKEND_DIR, RESULTS_DIR, git_commit, percentile
+
+HEAVY_MODULES = ["whisper", "torch", "numpy", "yt_dlp", "reportlab", "deep_translator",
+                 "soundfile", "apscheduler", "requests"]
+
+# Runs in a fresh interpreter for every sample
+PROBE = """
+import asyncio, json, logging, resource, sys, time
+logging.disable(logging.CRITICAL)
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def run_lifespan():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(run_lifespan())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "lifespan_ms": (ready - imported) * 1000,
+    "heavy_modules": [m for m in %r if m in sys.modules],
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+
+def sample(role: str) -> dict:
+    """
+    Start one fresh interpreter in the given role and return its timings.
+
+    The `all` role starts queue workers, so the interpreter runs in a
+    temporary directory with its own job queue, outputs and fingerprint
+    index rather than the ones in the backend directory.
+    """
+    with tempfile.TemporaryDirectory(prefix="startup_bench_") as workdir:
+        env = dict(
+            os.environ,
+            APP_ROLE=role,
+            PYTHONPATH=os.pathsep.join(filter(None, [BACKEND_DIR, os.environ.get("PYTHONPATH")])),
+            JOB_QUEUE_URL=f"sqlite:///{os.path.join(workdir, 'jobs.sqlite3')}",
+            OUTPUTS_DIR=os.path.join(workdir, "outputs"),
+            FINGERPRINT_DB=os.path.join(workdir, "fingerprints.sqlite3"),
+        )
+        output = subprocess.check_output(
+            [sys.executable, "-c", PROBE % HEAVY_MODULES], cwd=workdir, env=env, text=True
+        )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarise(values: list) -> dict:
+    return {
+        "min": min(values),
+        "p50": percentile(values, 50),
+        "p99": percentile(values, 99),
+        "max": max(values),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure API cold start time")
+    parser.add_argument("--role", nargs="+", default=["api", "all"], choices=["all", "api", "worker"])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", help="JSON output path (default: benchmarks/results/startup_<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    roles = {}
+    for role in args.role:
+        samples = [sample(role) for _ in range(args.runs)]
+        roles[role] = {
+            "runs": len(samples),
+            "import_ms": summarise([s["import_ms"] for s in samples]),
+            "lifespan_ms": summarise([s["lifespan_ms"] for s in samples]),
+            "total_ms": summarise([s["import_ms"] + s["lifespan_ms"] for s in samples]),
+            "peak_rss_mb": max(s["peak_rss_mb"] for s in samples),
+            "heavy_modules": samples[-1]["heavy_modules"],
+        }
+        print(f"[startup] {role}: total p50={roles[role]['total_ms']['p50']:.0f}ms "
+              f"p99={roles[role]['total_ms']['p99']:.0f}ms heavy={roles[role]['heavy_modules']}")
+
+    report = {
+        "schema": 1,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "host": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+        },
+        "roles": roles,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[startup] results written to {output}")
+    return report
+
+
+if __name__ == "__main__":
+    main()
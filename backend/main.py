@@ -1,19 +1,24 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, field_validator, ConfigDict
 import logging
 import mimetypes
 import os
-from services.youtube import download_audio, extract_video_id
-from services.transcription import transcribe_audio
-from services.translation import translate_text
-from services.notes import generate_notes
-from services.pdf import create_pdf
-from services.file_manager import file_manager
-import os
-import mimetypes
+from services.youtube import extract_video_id, probe_video
+from services.file_manager import file_manager, codec_for_path
+from services.jobs import get_queue, DONE, FAILED, CANCELLED
+from services.pipeline import existing_result
+from services.segments import SegmentIndex, iter_subtitles
+from services.scheduler import get_admission, estimate_cost, QueueFullError
+from services.captions import CAPTION_POLICIES, get_caption_policy, select_caption_track
+from services.transcription import BACKENDS, get_backend
+from services.fingerprint import get_index
+from services import runtime
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -29,7 +34,13 @@ logger = logging.getLogger(__name__)
 mimetypes.add_type("application/javascript", ".js")
 mimetypes.add_type("text/css", ".css")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    runtime.startup(runtime.get_role())
+    yield
+    runtime.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -50,6 +61,8 @@ class TranscriptRequest(BaseModel):
     youtube_url: str
     model_size: str = "base"
     target_language: str = "en"
+    caption_policy: str | None = None  # off, manual or auto; default from CAPTION_POLICY
+    transcription_backend: str | None = None  # whisper or faster-whisper; default from TRANSCRIPTION_BACKEND
     
     @field_validator('model_size')
     @classmethod
@@ -58,6 +71,20 @@ class TranscriptRequest(BaseModel):
             raise ValueError("Invalid model size")
         return v
 
+    @field_validator('caption_policy')
+    @classmethod
+    def validate_caption_policy(cls, v):
+        if v is not None and v not in CAPTION_POLICIES:
+            raise ValueError("Invalid caption policy")
+        return v
+
+    @field_validator('transcription_backend')
+    @classmethod
+    def validate_transcription_backend(cls, v):
+        if v is not None and v not in BACKENDS:
+            raise ValueError("Invalid transcription backend")
+        return v
+
 class TranscriptResponse(BaseModel):
     model_config = ConfigDict(protected_namespaces=())
 
@@ -65,121 +92,165 @@ class TranscriptResponse(BaseModel):
     detected_language: str
     target_language: str
     translated: bool
-    audio_path: str
+    transcript_source: str = "whisper"  # or "captions" (the video's subtitles), "duplicate" (same audio seen before)
+    audio_path: str  # empty when captions were used and no audio was downloaded
     transcript_path: str
     notes_path: str
     pdf_path: str
 
-# Removed complex progress tracking - keeping it simple
+class JobResponse(BaseModel):
+    id: str
+    status: str
+    attempts: int
+    cost: float = 0.0
+    cancel_requested: bool = False  # nobody is waiting any more; the worker is stopping it
+    waiter: str | None = None  # returned by POST /api/jobs only; pass it to DELETE /api/jobs/{id}
+    error: str | None = None
+    result: TranscriptResponse | None = None
+    created_at: float
+    updated_at: float
+
+class Segment(BaseModel):
+    index: int
+    start: float
+    end: float
+    text: str
+
+class SegmentsResponse(BaseModel):
+    video_id: str
+    language: str
+    total: int
+    segments: list[Segment]
+
+JOB_WAIT_TIMEOUT = float(os.getenv("JOB_WAIT_TIMEOUT", "3600"))
+JOB_POLL_INTERVAL = (0.05, 1.0)  # first and maximum delay between status checks
+
+def client_id_for(http_request: Request) -> str:
+    """Identify the client for fair scheduling: X-Client-Id header, else the peer address."""
+    client_id = http_request.headers.get("X-Client-Id")
+    if not client_id and http_request.client:
+        client_id = http_request.client.host
+    return client_id or "anonymous"
+
+def enqueue_video(request: TranscriptRequest, client_id: str) -> dict:
+    """
+    Admit the pipeline for a video into the queue, charged by its expected cost
+    (much lower when the video has usable captions). Identical requests share
+    one job; jobs for the same video with other settings run one after the
+    other, since they write the same files.
+
+    Raises:
+        QueueFullError: The queue is full
+    """
+    video_id = extract_video_id(request.youtube_url)
+    # Defaults resolved, so only requests that would run the same way share a job
+    backend = get_backend(request.transcription_backend).name
+    caption_policy = get_caption_policy(request.caption_policy)
+    job_id = f"{video_id}:{request.model_size}:{request.target_language}:{backend}:{caption_policy}"
+    # Turn requests away before probing, which imports yt-dlp and blocks on a
+    # fetch from YouTube
+    get_admission().check_capacity(job_id, client_id)
+    try:
+        info = probe_video(request.youtube_url, video_id)
+    except Exception as e:
+        logger.warning(f"Could not probe video {video_id}, assuming default duration: {str(e)}")
+        info = {}
+    captions = select_caption_track(info, request.target_language, caption_policy)
+    cost = estimate_cost(info.get("duration"), request.model_size, captions=captions is not None,
+                         backend=backend)
+    # Workers may have other defaults, so they get the resolved settings
+    payload = dict(request.model_dump(), transcription_backend=backend, caption_policy=caption_policy)
+    return get_admission().admit("process_video", payload, job_id, cost, client_id, group_id=video_id)
+
+def queue_full_response(e: QueueFullError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def wait_for_job(job_id: str, http_request: Request, timeout: float = JOB_WAIT_TIMEOUT) -> dict:
+    """Poll the queue until a job is done, failed or cancelled, or the client goes away."""
+    deadline = time.monotonic() + timeout
+    interval, max_interval = JOB_POLL_INTERVAL
+    while time.monotonic() < deadline:
+        job = await asyncio.to_thread(get_queue().get, job_id)
+        if job is None or job["status"] in (DONE, FAILED, CANCELLED):
+            return job
+        if await http_request.is_disconnected():
+            logger.info(f"Client stopped waiting for job {job_id}")
+            raise HTTPException(status_code=499, detail="Client closed the request")
+        await asyncio.sleep(interval)
+        interval = min(interval * 1.5, max_interval)
+    raise HTTPException(status_code=504, detail="Timed out waiting for the job to finish")
 
 @api_router.post("/transcript", response_model=TranscriptResponse)
-async def process_video(request: TranscriptRequest):
+async def process_video(request: TranscriptRequest, http_request: Request):
     try:
-        # Extract video ID
+        # Files already generated (possibly by another node): no need to queue
         video_id = extract_video_id(request.youtube_url)
-        logger.info(f"Processing video ID: {video_id}")
-
-        # Check if all required files already exist
-        required_files = ['audio', 'transcript', 'notes', 'pdf']
-        existing_files = {file_type: file_manager.file_exists(video_id, file_type)
-                         for file_type in required_files}
-
-        if all(existing_files.values()):
+        result = existing_result(video_id, request.target_language)
+        if result:
             logger.info(f"All files already exist for video {video_id}, returning existing paths")
-            return TranscriptResponse(
-                video_id=video_id,
-                detected_language="en",  # Default, will be updated if needed
-                target_language=request.target_language,
-                translated=False,  # Default, will be updated if needed
-                audio_path=file_manager.get_file_path(video_id, "audio"),
-                transcript_path=file_manager.get_file_path(video_id, "transcript"),
-                notes_path=file_manager.get_file_path(video_id, "notes"),
-                pdf_path=file_manager.get_file_path(video_id, "pdf")
-            )
-        
-        # Step 1: Download audio if needed
-        audio_path = None
-        if not existing_files['audio']:
-            logger.info(f"Downloading audio for video {video_id}")
-            audio_path = await download_audio(request.youtube_url, video_id)
-            if not os.path.exists(audio_path):
-                raise HTTPException(status_code=500, detail="Failed to download audio file")
-        else:
-            audio_path = file_manager.get_file_path(video_id, "audio")
-            logger.info(f"Using existing audio file: {audio_path}")
-        
-        # Step 2: Transcribe audio if needed
-        transcript = None
-        detected_lang = "en"
-        translated = False
-        transcript_path = None
-
-        if not existing_files['transcript']:
-            logger.info(f"Transcribing audio for video {video_id}")
-            result = transcribe_audio(audio_path)
-            transcript, detected_lang = result  # Unpack the tuple
-            transcript_path = file_manager.get_file_path(video_id, "transcript")
-            with open(transcript_path, "w", encoding="utf-8") as f:
-                f.write(transcript)
-        else:
-            transcript_path = file_manager.get_file_path(video_id, "transcript")
-            try:
-                transcript = read_transcript(transcript_path)
-                logger.info(f"Using existing transcript file: {transcript_path}")
-            except Exception as e:
-                logger.error(f"Error reading transcript file: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Failed to read transcript file: {str(e)}")
-
-        # Step 3: Translate if needed
-        if request.target_language != detected_lang:
-            logger.info(f"Translating transcript to {request.target_language}")
-            transcript = await translate_text(transcript, request.target_language)
-            translated = True
-            with open(transcript_path, "w", encoding="utf-8") as f:
-                f.write(transcript)
-
-        # Step 4: Generate notes if needed
-        if not existing_files['notes']:
-            logger.info(f"Generating notes for video {video_id} in {request.target_language}")
-            notes = generate_notes(transcript, request.target_language)
-            notes_path = file_manager.get_file_path(video_id, "notes")
-            with open(notes_path, "w", encoding="utf-8") as f:
-                f.write(notes)
-        else:
-            notes_path = file_manager.get_file_path(video_id, "notes")
-            try:
-                notes = read_transcript(notes_path)
-                logger.info(f"Using existing notes file: {notes_path}")
-            except Exception as e:
-                logger.error(f"Error reading notes file: {str(e)}")
-                raise HTTPException(status_code=500, detail=f"Failed to read notes file: {str(e)}")
-
-        # Step 5: Create PDF if needed
-        if not existing_files['pdf']:
-            logger.info(f"Creating PDF for video {video_id}")
-            pdf_path = await create_pdf(notes, video_id)
-        else:
-            pdf_path = file_manager.get_file_path(video_id, "pdf")
-            logger.info(f"Using existing PDF file: {pdf_path}")
-
-        # Schedule cleanup
-        file_manager.schedule_cleanup(video_id)
-
-        return TranscriptResponse(
-            video_id=video_id,
-            detected_language=detected_lang,
-            target_language=request.target_language,
-            translated=translated,
-            audio_path=audio_path,
-            transcript_path=transcript_path,
-            notes_path=notes_path,
-            pdf_path=pdf_path
-        )
-        
+            return TranscriptResponse(**result)
+
+        job = await asyncio.to_thread(enqueue_video, request, client_id_for(http_request))
+        job_id, waiter = job["id"], job["waiter"]
+        logger.info(f"Queued job {job_id} for video {video_id}")
+        try:
+            job = await wait_for_job(job_id, http_request)
+        finally:
+            # Once no request is waiting for the job any more, it is cancelled
+            await asyncio.to_thread(get_queue().release, job_id, waiter)
+        if job is None or job["status"] != DONE:
+            raise Exception(job["error"] if job else "Job disappeared from the queue")
+        return TranscriptResponse(**job["result"])
+
+    except HTTPException:
+        raise
+    except QueueFullError as e:
+        raise queue_full_response(e)
     except Exception as e:
         logger.error(f"Error processing video: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(request: TranscriptRequest, http_request: Request):
+    """Queue a video for processing and return immediately; poll GET /api/jobs/{id}."""
+    try:
+        return JobResponse(**await asyncio.to_thread(enqueue_video, request, client_id_for(http_request)))
+    except QueueFullError as e:
+        raise queue_full_response(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@api_router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the status (and, once done, the result) of a queued job"""
+    job = await asyncio.to_thread(get_queue().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job)
+
+@api_router.delete("/jobs/{job_id}", response_model=JobResponse)
+async def cancel_job(job_id: str, waiter: str):
+    """
+    Stop waiting for a job created with POST /api/jobs, identified by the
+    `waiter` token that call returned. The job is cancelled unless other
+    requests are still waiting for it; a running job stops at its next
+    cancellation check, reported by `cancel_requested`. Repeating the call
+    with the same token has no further effect.
+    """
+    job = await asyncio.to_thread(get_queue().release, job_id, waiter)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobResponse(**job)
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Job counts by status, audio dedup hit rate and savings, and disk used by retained files"""
+    return {
+        "jobs": await asyncio.to_thread(get_queue().counts),
+        "dedup": await asyncio.to_thread(get_index().stats),
+        "storage": await asyncio.to_thread(file_manager.storage_stats),
+    }
+
 # Test endpoint to check file existence
 @api_router.get("/files/{video_id}")
 async def list_files(video_id: str):
@@ -198,10 +269,67 @@ async def list_files(video_id: str):
         logger.error(f"Error listing files: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Timestamped segment endpoints
+@api_router.get("/segments/{video_id}", response_model=SegmentsResponse)
+async def get_segments(video_id: str, start: float | None = None, end: float | None = None):
+    """Get the transcript segments overlapping [start, end) seconds (all segments by default)"""
+    segments_path = file_manager.get_file_path(video_id, "segments")
+    if not os.path.exists(segments_path):
+        raise HTTPException(status_code=404, detail="Segments not found")
+    with SegmentIndex(segments_path) as index:
+        return SegmentsResponse(
+            video_id=video_id,
+            language=index.language,
+            total=len(index),
+            segments=[index[i] for i in index.find(start, end)]
+        )
+
+@api_router.get("/segments/{video_id}/export")
+async def export_segments(video_id: str, format: str = "srt"):
+    """Download the transcript as SRT or WebVTT subtitles"""
+    media_types = {
+        'srt': 'application/x-subrip',
+        'vtt': 'text/vtt'
+    }
+    if format not in media_types:
+        raise HTTPException(status_code=400, detail="Invalid subtitle format")
+
+    segments_path = file_manager.get_file_path(video_id, "segments")
+    if not os.path.exists(segments_path):
+        raise HTTPException(status_code=404, detail="Segments not found")
+
+    filename = f"video_{video_id}.{format}"
+    return StreamingResponse(
+        iter_subtitles(segments_path, format),
+        media_type=f"{media_types[format]}; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows `encoding`, by name or through `*`."""
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            qualities[coding.lower()] = quality
+    return qualities.get(encoding, qualities.get("*", 0.0)) > 0
+
 # Download endpoints
 @api_router.get("/download/{video_id}/{file_type}")
-async def download_file(video_id: str, file_type: str):
-    """Download a specific file for a video"""
+async def download_file(video_id: str, file_type: str, http_request: Request):
+    """
+    Download a specific file for a video. Compressed text artifacts are sent
+    as stored, with Content-Encoding, to clients that accept their codec, and
+    decompressed for the others.
+    """
     try:
         if file_type not in ['audio', 'transcript', 'notes', 'pdf']:
             raise HTTPException(status_code=400, detail="Invalid file type")
@@ -229,17 +357,28 @@ async def download_file(video_id: str, file_type: str):
         media_type = media_types.get(file_type, 'application/octet-stream')
         extension = extensions.get(file_type, 'txt')
         filename = f"video_{video_id}_{file_type}.{extension}"
+        headers = {
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Cache-Control": "no-cache"
+        }
+
+        codec = codec_for_path(file_path)
+        if codec:
+            headers["Vary"] = "Accept-Encoding"
+            if not accepts_encoding(http_request.headers.get("accept-encoding", ""), codec):
+                content = await asyncio.to_thread(file_manager.read_bytes, file_path)
+                return Response(content, media_type=media_type, headers=headers)
+            headers["Content-Encoding"] = codec
 
         return FileResponse(
             file_path,
             media_type=media_type,
             filename=filename,
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Cache-Control": "no-cache"
-            }
+            headers=headers
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error downloading file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -247,8 +386,10 @@ async def download_file(video_id: str, file_type: str):
 # Include the API router BEFORE frontend routes
 app.include_router(api_router)
 
-# Mount the frontend static files
-app.mount("/assets", StaticFiles(directory="../frontend/dist/assets"), name="assets")
+# Mount the frontend static files (skipped when the frontend has not been built,
+# e.g. when the API is imported by the benchmarks)
+if os.path.isdir("../frontend/dist/assets"):
+    app.mount("/assets", StaticFiles(directory="../frontend/dist/assets"), name="assets")
 
 @app.get("/{path:path}")
 async def serve_frontend(path: str):
@@ -269,40 +410,3 @@ async def serve_frontend(path: str):
         file_path,
         media_type=media_type
     )
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    file_manager.scheduler.shutdown()
-
-def read_transcript(file_path: str) -> str:
-    """Read transcript file with robust encoding handling."""
-    try:
-        # First try reading as binary
-        with open(file_path, 'rb') as f:
-            content = f.read()
-            
-        # Try to detect encoding using chardet
-        import chardet
-        detected = chardet.detect(content)
-        encoding = detected['encoding'] if detected['encoding'] else 'utf-8'
-        
-        # Try detected encoding first
-        try:
-            return content.decode(encoding, errors='replace')
-        except UnicodeDecodeError:
-            pass
-            
-        # If detected encoding fails, try common encodings
-        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1', 'ascii']
-        for enc in encodings:
-            try:
-                return content.decode(enc, errors='replace')
-            except UnicodeDecodeError:
-                continue
-                
-        # If all else fails, use latin-1 which can decode any byte sequence
-        return content.decode('latin-1', errors='replace')
-        
-    except Exception as e:
-        logger.error(f"Error reading file: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to read file: {str(e)}") 
\ No newline at end of file
@@ -0,0 +1,29 @@
+import threading
+
+class Cancelled(Exception):
+    """Raised inside a job once its CancelToken has been cancelled."""
+
+class CancelToken:
+    """
+    Cooperative cancellation for one pipeline run.
+
+    The worker cancels the token when nobody is waiting for the job any more
+    (see JobQueue.release); each step checks it between units of work (a
+    download progress update, a transcription window, a translation chunk,
+    an LLM call, a PDF page) and stops by raising Cancelled. Work already in
+    progress in a unit is not interrupted.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled("Job was cancelled")
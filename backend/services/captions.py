@@ -0,0 +1,145 @@
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Caption policies:
+#   off:    always download the audio and run Whisper
+#   manual: use human-written subtitles when the video has them
+#   auto:   like manual, falling back to YouTube's automatic captions
+CAPTION_POLICIES = ("off", "manual", "auto")
+
+def get_caption_policy(policy: str | None = None) -> str:
+    """Resolve the caption policy for a request, defaulting to CAPTION_POLICY (manual)."""
+    policy = (policy or os.getenv("CAPTION_POLICY", "manual")).lower()
+    if policy not in CAPTION_POLICIES:
+        raise ValueError(f"Invalid caption policy '{policy}', expected one of {', '.join(CAPTION_POLICIES)}")
+    return policy
+
+def trim_tracks(tracks: dict | None) -> dict:
+    """Keep only the WebVTT formats of a yt-dlp subtitles dict, which is all we can parse."""
+    trimmed = {}
+    for language, formats in (tracks or {}).items():
+        vtt = [{"ext": "vtt", "url": f["url"]} for f in formats if f.get("ext") == "vtt" and f.get("url")]
+        if vtt:
+            trimmed[language] = vtt
+    return trimmed
+
+def _match_language(tracks: dict, language: str) -> str | None:
+    """Find the track for `language`, accepting regional variants (en matches en-US)."""
+    if language in tracks:
+        return language
+    base = language.split("-")[0].lower()
+    for key in sorted(tracks):
+        if key.split("-")[0].lower() == base:
+            return key
+    return None
+
+def select_caption_track(info: dict, target_language: str, policy: str) -> dict | None:
+    """
+    Pick the best caption track for a video from its yt-dlp info dict.
+
+    Manual subtitles are preferred over automatic captions, and within each
+    kind the target language is preferred over the video's own language, so
+    that no translation is needed.
+
+    Args:
+        info (dict): yt-dlp info dict (see youtube.probe_video)
+        target_language (str): Language requested for the transcript
+        policy (str): One of CAPTION_POLICIES
+
+    Returns:
+        dict | None: {"kind", "language", "ext", "url"} or None if no track qualifies
+    """
+    if policy == "off":
+        return None
+
+    languages = [target_language]
+    if info.get("language") and info["language"] not in languages:
+        languages.append(info["language"])
+
+    kinds = [("manual", "subtitles")]
+    if policy == "auto":
+        kinds.append(("auto", "automatic_captions"))
+
+    for kind, key in kinds:
+        tracks = info.get(key) or {}
+        for language in languages:
+            match = _match_language(tracks, language)
+            if match:
+                track = tracks[match][0]
+                return {"kind": kind, "language": match.split("-")[0].lower(), "ext": track["ext"], "url": track["url"]}
+    return None
+
+TIMESTAMP = r"(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})"
+CUE_TIMING = re.compile(rf"^{TIMESTAMP}\s+-->\s+{TIMESTAMP}")
+
+def _seconds(hours, minutes, seconds, milliseconds) -> float:
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(milliseconds) / 1000
+
+def parse_vtt(text: str) -> list:
+    """
+    Parse WebVTT captions into transcript segments.
+
+    YouTube's automatic captions repeat the previous line at the top of every
+    cue as the text scrolls; repeated lines are dropped so each spoken line
+    appears once.
+
+    Returns:
+        list: Dicts with `start`, `end` (seconds) and `text`
+    """
+    segments = []
+    previous_line = None
+    for block in re.split(r"\n\s*\n", text.replace("\r\n", "\n")):
+        lines = block.strip().split("\n")
+        for i, line in enumerate(lines):
+            timing = CUE_TIMING.match(line)
+            if timing:
+                break
+        else:
+            continue  # header, NOTE or STYLE block
+
+        start = _seconds(*timing.groups()[:4])
+        end = _seconds(*timing.groups()[4:])
+        new_lines = []
+        for line in lines[i + 1:]:
+            # Strip inline timestamps and styling tags, and entities YouTube uses
+            line = re.sub(r"<[^>]+>", "", line).replace("&nbsp;", " ").replace("&amp;", "&").strip()
+            if line and line != previous_line:
+                new_lines.append(line)
+                previous_line = line
+        if new_lines:
+            segments.append({"start": start, "end": end, "text": " ".join(new_lines)})
+    return segments
+
+def fetch_captions(info: dict, target_language: str, policy: str) -> tuple[str, str, list, dict] | None:
+    """
+    Build a transcript from the video's existing captions, if the policy allows.
+
+    Returns:
+        tuple | None: (transcript, language, segments, provenance), or None
+            when there is no suitable track or it could not be used
+    """
+    track = select_caption_track(info, target_language, policy)
+    if track is None:
+        return None
+
+    try:
+        import requests
+
+        logger.info(f"Using {track['kind']} {track['language']} captions")
+        response = requests.get(track["url"], timeout=30)
+        response.raise_for_status()
+        segments = parse_vtt(response.text)
+    except Exception as e:
+        logger.warning(f"Could not use captions, falling back to transcription: {str(e)}")
+        return None
+
+    if not segments:
+        logger.warning("Caption track is empty, falling back to transcription")
+        return None
+
+    transcript = " ".join(segment["text"] for segment in segments)
+    provenance = {"kind": track["kind"], "language": track["language"], "format": track["ext"]}
+    return transcript, track["language"], segments, provenance
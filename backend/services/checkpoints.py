@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from .file_manager import file_manager
+
+logger = logging.getLogger(__name__)
+
+# Hex digits of the parameters' hash in a checkpoint's file name
+DIGEST_CHARS = 12
+
+def params_digest(params: dict) -> str:
+    return hashlib.sha1(json.dumps(params, sort_keys=True).encode("utf-8")).hexdigest()[:DIGEST_CHARS]
+
+class Checkpoint:
+    """
+    Progress of a video's pipeline run, so a retried or resumed job carries
+    on where the previous attempt stopped instead of starting over.
+
+    Records are appended to a JSON lines file in the output directory as
+    each piece of work finishes: transcribed windows, translated chunks and
+    note section drafts. Each set of parameters has its own file, named
+    after their hash, so concurrent jobs for one video (e.g. into different
+    languages) neither overwrite nor reuse each other's work; the first line
+    holds the parameters themselves. A line torn by a crash is dropped when
+    the file is loaded.
+    """
+
+    def __init__(self, video_id: str, params: dict):
+        self.path = file_manager.get_file_path(f"{video_id}_{params_digest(params)}", "checkpoint")
+        self.params = params
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._pieces = {}
+
+        header = {"type": "params", **params}
+        records = self._read()
+        if records[:1] == [header]:
+            for record in records[1:]:
+                self._apply(record)
+            if len(records) > 1:
+                logger.info(f"Resuming from checkpoint: {len(self._windows)} windows, "
+                            f"{len(self._pieces)} translated chunks and note drafts")
+        else:
+            records = [header]
+        # Rewritten to drop a torn line or stale parameters before appending
+        self._rewrite(records)
+
+    def _read(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break
+        return records
+
+    def _rewrite(self, records: list):
+        tmp_path = f"{self.path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _apply(self, record: dict):
+        if record["type"] == "window":
+            self._windows[record["number"]] = record
+        else:
+            self._pieces[(record["type"], record["number"])] = record
+
+    def _append(self, record: dict):
+        with self._lock:
+            self._apply(record)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def windows(self) -> list:
+        """Transcribed windows, in order, up to the first missing one."""
+        windows = []
+        while len(windows) in self._windows:
+            windows.append(self._windows[len(windows)])
+        return windows
+
+    def add_window(self, window: dict):
+        """Record a transcribed window (see transcription.transcribe_windows)."""
+        if window["number"] not in self._windows:
+            self._append({"type": "window", **window})
+
+    @staticmethod
+    def _digest(source: str) -> str:
+        return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    def get(self, kind: str, number: int, source: str) -> str | None:
+        """Result recorded for piece `number` of `kind`, if it was made from the same source text."""
+        record = self._pieces.get((kind, number))
+        if record and record["source"] == self._digest(source):
+            return record["text"]
+        return None
+
+    def put(self, kind: str, number: int, source: str, text: str):
+        """Record the result of piece `number` of `kind` (e.g. "translation", "draft")."""
+        self._append({"type": kind, "number": number, "source": self._digest(source), "text": text})
+
+    def clear(self):
+        """Remove the checkpoint once the run has completed."""
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
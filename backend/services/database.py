@@ -0,0 +1,27 @@
+import os
+import sqlite3
+import threading
+
+class ThreadLocalConnection:
+    """
+    Opens a SQLite database once per thread. Call the instance to get the
+    calling thread's connection.
+
+    Connections run in autocommit mode (callers use explicit transactions)
+    with WAL, so readers never block the single writer.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def __call__(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
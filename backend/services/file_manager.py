@@ -1,36 +1,225 @@
 import os
+import glob
+import gzip
 import shutil
 import logging
+import threading
+import importlib.util
 from datetime import datetime, timedelta
-from apscheduler.schedulers.background import BackgroundScheduler
 
 logger = logging.getLogger(__name__)
 
+# File type -> extension of the per-video files kept in the output directory
+FILE_TYPES = {
+    'audio': 'mp3',
+    'transcript': 'txt',
+    'notes': 'md',
+    'pdf': 'pdf',
+    'info': 'json',
+    'segments': 'seg',
+    'meta': 'json',
+    'checkpoint': 'jsonl',
+}
+
+# Text artifacts stored compressed, with the codec's suffix after the
+# extension (e.g. abc_transcript.txt.zst). Audio and PDF are compressed
+# formats already, segments are memory-mapped, and the JSON files are small.
+COMPRESSED_TYPES = ('transcript', 'notes')
+
+# Codec (also its HTTP Content-Encoding) -> file suffix
+CODECS = {
+    'zstd': 'zst',
+    'gzip': 'gz',
+}
+
+# Artifacts are written once and read many times, so they are compressed hard
+ZSTD_LEVEL = 19
+GZIP_LEVEL = 9
+
+def zstd_available() -> bool:
+    return importlib.util.find_spec("zstandard") is not None
+
+def get_codec() -> str | None:
+    """
+    Codec for new text artifacts from ARTIFACT_COMPRESSION: zstd, gzip or
+    none (default: zstd if the zstandard package is installed, else gzip).
+    """
+    codec = os.getenv("ARTIFACT_COMPRESSION", "zstd" if zstd_available() else "gzip").lower()
+    if codec == "none":
+        return None
+    if codec not in CODECS:
+        raise ValueError(f"Invalid artifact compression '{codec}', expected one of {', '.join(CODECS)}, none")
+    if codec == "zstd" and not zstd_available():
+        logger.warning("zstandard is not installed, compressing artifacts with gzip")
+        return "gzip"
+    return codec
+
+def codec_for_path(path: str) -> str | None:
+    """Codec a file was compressed with, from its suffix, or None for a plain file."""
+    for codec, suffix in CODECS.items():
+        if path.endswith(f".{suffix}"):
+            return codec
+    return None
+
+def compress(data: bytes, codec: str | None) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return data
+
+def decompress(data: bytes, codec: str | None) -> bytes:
+    if codec == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    return data
+
+def original_size(path: str) -> int:
+    """Size of a file's content once decompressed, read from the codec's header or trailer."""
+    codec = codec_for_path(path)
+    if codec == "gzip":
+        # ISIZE: the uncompressed size modulo 2**32, in the last four bytes
+        with open(path, "rb") as f:
+            f.seek(-4, os.SEEK_END)
+            return int.from_bytes(f.read(4), "little")
+    if codec == "zstd":
+        import zstandard
+        # Frame headers are at most 18 bytes; ZstdCompressor records the content size
+        with open(path, "rb") as f:
+            return zstandard.frame_content_size(f.read(18))
+    return os.path.getsize(path)
+
 class FileManager:
     def __init__(self):
-        self.base_dir = "outputs"
-        self.scheduler = BackgroundScheduler()
-        self.scheduler.start()
+        # Nothing is created or started here: the module-level instance is
+        # built on import, and initialisation belongs to the app lifespan
+        # (see services/runtime.py). Point OUTPUTS_DIR at a shared volume when
+        # API and worker processes run on different nodes.
+        self.base_dir = os.getenv("OUTPUTS_DIR", "outputs")
+        self.scheduler = None
+        self._lock = threading.Lock()
+        self._codec = None
+
+    @property
+    def codec(self) -> str | None:
+        """Codec new text artifacts are written with (see get_codec)."""
+        if self._codec is None:
+            self._codec = get_codec() or "none"
+        return None if self._codec == "none" else self._codec
+
+    def start(self, with_scheduler: bool = True):
+        """Create the output directory and, optionally, start the cleanup scheduler."""
         os.makedirs(self.base_dir, exist_ok=True)
+        if with_scheduler:
+            with self._lock:
+                if self.scheduler is None:
+                    from apscheduler.schedulers.background import BackgroundScheduler
+                    self.scheduler = BackgroundScheduler()
+                    self.scheduler.start()
+                    logger.info("Started cleanup scheduler")
+
+    def shutdown(self):
+        """Stop the cleanup scheduler if it was started."""
+        with self._lock:
+            if self.scheduler is not None:
+                self.scheduler.shutdown()
+                self.scheduler = None
         
+    def _paths(self, video_id: str, file_type: str, readable: bool = True) -> list:
+        """
+        Paths a file may be stored at, the one new files are written to first.
+
+        Text artifacts written before compression was enabled, or with
+        another codec, are still found; with `readable`, only if this
+        process can decompress them.
+        """
+        extension = FILE_TYPES.get(file_type, 'txt')
+        path = os.path.join(self.base_dir, f"{video_id}_{file_type}.{extension}")
+        if file_type not in COMPRESSED_TYPES:
+            return [path]
+        codecs = [codec for codec in CODECS if not readable or codec != "zstd" or zstd_available()]
+        paths = [f"{path}.{CODECS[codec]}" for codec in codecs] + [path]
+        preferred = f"{path}.{CODECS[self.codec]}" if self.codec else path
+        paths.remove(preferred)
+        return [preferred] + paths
+
     def get_file_path(self, video_id: str, file_type: str) -> str:
-        """Get path for a specific file type"""
-        extensions = {
-            'audio': 'mp3',
-            'transcript': 'txt',
-            'notes': 'md',
-            'pdf': 'pdf'
-        }
-        extension = extensions.get(file_type, 'txt')
-        return os.path.join(self.base_dir, f"{video_id}_{file_type}.{extension}")
+        """Get path for a specific file type: where it is stored, or else where it will be written"""
+        paths = self._paths(video_id, file_type)
+        for path in paths:
+            if os.path.exists(path):
+                return path
+        return paths[0]
         
     def file_exists(self, video_id: str, file_type: str) -> bool:
         """Check if a file exists"""
         return os.path.exists(self.get_file_path(video_id, file_type))
         
+    def write_text(self, video_id: str, file_type: str, text: str) -> str:
+        """
+        Write a text artifact atomically, compressed if it is one of
+        COMPRESSED_TYPES, replacing any earlier version of it.
+
+        Returns:
+            str: Path of the written file
+        """
+        path, *others = self._paths(video_id, file_type, readable=False)
+        data = compress(text.encode("utf-8"), codec_for_path(path))
+        tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        for other in others:
+            if os.path.exists(other):
+                os.remove(other)
+        return path
+
+    def read_bytes(self, path: str) -> bytes:
+        """Read a file, decompressing it if its suffix says it is compressed."""
+        with open(path, "rb") as f:
+            return decompress(f.read(), codec_for_path(path))
+
+    def storage_stats(self) -> dict:
+        """
+        Disk used by the files currently retained in the output directory,
+        and how much compressing the text artifacts saves.
+        """
+        stats = {"files": 0, "bytes": 0, "codec": self.codec or "none",
+                 "text_files": 0, "text_bytes": 0, "text_original_bytes": 0}
+        if not os.path.isdir(self.base_dir):
+            return stats
+        for entry in os.scandir(self.base_dir):
+            if not entry.is_file():
+                continue
+            size = entry.stat().st_size
+            stats["files"] += 1
+            stats["bytes"] += size
+            name = entry.name
+            codec = codec_for_path(name)
+            if codec:
+                name = name[:-len(CODECS[codec]) - 1]
+            file_type = os.path.splitext(name)[0].rsplit("_", 1)[-1]
+            if file_type in COMPRESSED_TYPES:
+                try:
+                    original = original_size(entry.path)
+                except Exception as e:
+                    logger.warning(f"Could not read the size of {entry.path}: {str(e)}")
+                    continue
+                stats["text_files"] += 1
+                stats["text_bytes"] += size
+                stats["text_original_bytes"] += original
+        stats["saved_bytes"] = stats["text_original_bytes"] - stats["text_bytes"]
+        stats["compression_ratio"] = (round(stats["text_original_bytes"] / stats["text_bytes"], 2)
+                                      if stats["text_bytes"] else None)
+        return stats
+
     def schedule_cleanup(self, video_id: str, delay_hours: int = 1):
         """Schedule cleanup of video files after specified hours"""
         job_id = f"cleanup_{video_id}"
+        self.start()
         
         # Remove existing job if it exists
         try:
@@ -53,15 +242,27 @@ class FileManager:
         logger.info(f"Scheduled cleanup for video {video_id} at {cleanup_time}")
         
     def cleanup_files(self, video_id: str):
-        """Remove all files for a video"""
+        """Remove all files for a video, and its fingerprint so it is no longer offered for reuse"""
         try:
-            for file_type in ['audio', 'transcript', 'notes', 'pdf']:
-                file_path = self.get_file_path(video_id, file_type)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    logger.info(f"Cleaned up {file_type} file for video {video_id}")
+            for file_type in FILE_TYPES:
+                for file_path in self._paths(video_id, file_type, readable=False):
+                    if os.path.exists(file_path):
+                        os.remove(file_path)
+                        logger.info(f"Cleaned up {file_type} file for video {video_id}")
+            # Checkpoints of unfinished runs, one per set of parameters
+            from .checkpoints import DIGEST_CHARS  # checkpoints imports this module
+            pattern = f"{glob.escape(video_id)}_{'[0-9a-f]' * DIGEST_CHARS}_checkpoint.jsonl"
+            for file_path in glob.glob(os.path.join(glob.escape(self.base_dir), pattern)):
+                os.remove(file_path)
+                logger.info(f"Cleaned up checkpoint file for video {video_id}")
         except Exception as e:
             logger.error(f"Error cleaning up files for video {video_id}: {str(e)}")
+
+        try:
+            from .fingerprint import get_index  # fingerprint imports this module
+            get_index().remove(video_id)
+        except Exception as e:
+            logger.error(f"Error removing fingerprint of video {video_id}: {str(e)}")
             
     def cleanup_all_files(self):
         """Remove all files in the output directory"""
@@ -0,0 +1,300 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from .database import ThreadLocalConnection
+from .file_manager import file_manager
+from .segments import SegmentIndex
+
+# numpy is imported inside the functions that compute fingerprints, so API
+# processes that only report metrics do not load it.
+
+logger = logging.getLogger(__name__)
+
+# Acoustic fingerprint: the 16 kHz audio is decimated to 16000 / 3 Hz and cut
+# into 384 ms frames every 24 ms. Each frame's energy in 33 log-spaced bands
+# between 300 Hz and 2 kHz gives one 32-bit sub-fingerprint, one bit per
+# adjacent band pair: whether the energy difference between the bands grew
+# since the previous frame. The bits survive re-encoding, volume changes and
+# small time shifts, so re-uploads of the same recording have nearly
+# identical fingerprints while unrelated audio differs in half of its bits.
+DECIMATION = 3
+RATE = 16000 / DECIMATION
+FRAME = 2048
+HOP = 128
+HOP_SECONDS = HOP / RATE
+BITS = 32
+BAND_EDGES = (300.0, 2000.0)
+BLOCK = 1024  # frames per FFT batch, to bound memory
+
+# Only every INDEX_STEP-th sub-fingerprint of a stored video is indexed; a
+# query looks up every sub-fingerprint of a few probe regions, so alignments
+# are still found at any offset.
+INDEX_STEP = 4
+PROBE_FRAMES = 1024
+PROBES = (0.1, 0.5, 0.9)
+MIN_VOTES = 3
+# A candidate is accepted when at most this fraction of the bits differ over
+# the query (unrelated audio: ~0.5) and the query is covered almost entirely:
+# a clip of a processed video matches it, a longer video does not match a clip.
+MAX_BIT_ERROR_RATE = 0.25
+MIN_COVERAGE = 0.9
+# Sub-fingerprints of silence and clipping carry no information
+IGNORED_HASHES = (0, 0xFFFFFFFF)
+
+def fingerprint_audio(audio):
+    """
+    Compute the fingerprint of 16 kHz mono audio.
+
+    Args:
+        audio: float32 numpy array of 16 kHz samples
+
+    Returns:
+        numpy.ndarray: uint32 sub-fingerprints, one per HOP_SECONDS
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import sliding_window_view
+
+    # Average groups of samples as a crude low-pass filter before decimating:
+    # every band used is below the new Nyquist frequency
+    samples = audio[:len(audio) // DECIMATION * DECIMATION].reshape(-1, DECIMATION).mean(axis=1)
+    if len(samples) < FRAME:
+        return np.zeros(0, dtype=np.uint32)
+
+    frames = sliding_window_view(samples, FRAME)[::HOP]
+    window = np.hanning(FRAME).astype(np.float32)
+    frequencies = np.fft.rfftfreq(FRAME, 1 / RATE)
+    bands = np.digitize(frequencies, np.geomspace(*BAND_EDGES, BITS + 2)) - 1
+    membership = (bands[:, None] == np.arange(BITS + 1)).astype(np.float32)
+
+    energies = np.empty((len(frames), BITS + 1), dtype=np.float32)
+    for start in range(0, len(frames), BLOCK):
+        spectrum = np.abs(np.fft.rfft(frames[start:start + BLOCK] * window, axis=1)) ** 2
+        energies[start:start + BLOCK] = spectrum.astype(np.float32) @ membership
+
+    differences = energies[:, :-1] - energies[:, 1:]
+    bits = differences[1:] - differences[:-1] > 0
+    return np.packbits(bits, axis=1, bitorder="little").view("<u4").ravel().astype(np.uint32)
+
+def bit_error_rate(a, b) -> float:
+    """Fraction of differing bits between two equally long fingerprints."""
+    import numpy as np
+    return float(np.unpackbits(np.bitwise_xor(a, b).view(np.uint8)).mean())
+
+class FingerprintIndex:
+    """
+    SQLite index of the fingerprints of processed videos, with counters for
+    the dedup metrics. Put FINGERPRINT_DB on a shared volume, like the job
+    queue, when workers run on several machines.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connect = ThreadLocalConnection(path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    video_id TEXT PRIMARY KEY,
+                    duration REAL NOT NULL,
+                    data BLOB NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS hashes (hash INTEGER NOT NULL, video_id TEXT NOT NULL, frame INTEGER NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS hashes_by_hash ON hashes (hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS hashes_by_video ON hashes (video_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+
+    def add(self, video_id: str, fingerprint, duration: float):
+        """Index (or re-index) a video's fingerprint."""
+        rows = [(int(fingerprint[frame]), video_id, frame)
+                for frame in range(0, len(fingerprint), INDEX_STEP)
+                if int(fingerprint[frame]) not in IGNORED_HASHES]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM hashes WHERE video_id = ?", (video_id,))
+            conn.execute("INSERT OR REPLACE INTO fingerprints (video_id, duration, data, created_at) VALUES (?, ?, ?, ?)",
+                         (video_id, duration, fingerprint.astype("<u4").tobytes(), time.time()))
+            conn.executemany("INSERT INTO hashes (hash, video_id, frame) VALUES (?, ?, ?)", rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remove(self, video_id: str):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM hashes WHERE video_id = ?", (video_id,))
+            conn.execute("DELETE FROM fingerprints WHERE video_id = ?", (video_id,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _load(self, video_id: str):
+        import numpy as np
+        row = self._connect().execute("SELECT data FROM fingerprints WHERE video_id = ?", (video_id,)).fetchone()
+        return np.frombuffer(row["data"], dtype="<u4") if row else None
+
+    def search(self, fingerprint, exclude: str | None = None) -> dict | None:
+        """
+        Find an indexed video that contains the audio of `fingerprint`.
+        Videos whose segments file is gone are skipped.
+
+        Args:
+            fingerprint: Query fingerprint (see fingerprint_audio)
+            exclude (str | None): Video ID to ignore, i.e. the query's own
+
+        Returns:
+            dict | None: {"video_id", "offset" (seconds into the match),
+                "bit_error_rate"} for the best match, or None
+        """
+        votes = Counter()
+        conn = self._connect()
+        for position in PROBES:
+            start = int(max(0, len(fingerprint) - PROBE_FRAMES) * position)
+            probe = {}
+            for frame in range(start, min(len(fingerprint), start + PROBE_FRAMES)):
+                value = int(fingerprint[frame])
+                if value not in IGNORED_HASHES:
+                    probe.setdefault(value, frame)
+            values = list(probe)
+            for i in range(0, len(values), 500):
+                batch = values[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT hash, video_id, frame FROM hashes WHERE hash IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for row in rows:
+                    if row["video_id"] != exclude:
+                        votes[(row["video_id"], row["frame"] - probe[row["hash"]])] += 1
+
+        best = None
+        for (video_id, offset), count in votes.most_common(10):
+            if count < MIN_VOTES:
+                break
+            stored = self._load(video_id)
+            if stored is None:
+                continue
+            # The video's files may be gone while its fingerprint is still
+            # indexed; a later candidate can still match
+            if not os.path.exists(file_manager.get_file_path(video_id, "segments")):
+                continue
+            # A negative offset means the query starts before the stored audio
+            query_start, stored_start = max(0, -offset), max(0, offset)
+            overlap = min(len(fingerprint) - query_start, len(stored) - stored_start)
+            if overlap < MIN_COVERAGE * len(fingerprint):
+                continue
+            error_rate = bit_error_rate(fingerprint[query_start:query_start + overlap],
+                                        stored[stored_start:stored_start + overlap])
+            if error_rate <= MAX_BIT_ERROR_RATE and (best is None or error_rate < best["bit_error_rate"]):
+                best = {"video_id": video_id, "offset": offset * HOP_SECONDS, "bit_error_rate": error_rate}
+        return best
+
+    def record(self, hit: bool, audio_seconds: float, fingerprint_seconds: float, saved_seconds: float = 0.0):
+        """Count one lookup for the dedup metrics."""
+        increments = {"lookups": 1, "hits": int(hit), "fingerprint_seconds": fingerprint_seconds,
+                      "audio_seconds": audio_seconds, "audio_seconds_reused": audio_seconds if hit else 0.0,
+                      "worker_seconds_saved": saved_seconds}
+        self._connect().executemany("""
+            INSERT INTO stats (key, value) VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = value + excluded.value
+        """, list(increments.items()))
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        stats = {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM stats")}
+        lookups = int(stats.get("lookups", 0))
+        hits = int(stats.get("hits", 0))
+        return {
+            "indexed_videos": conn.execute("SELECT COUNT(*) AS n FROM fingerprints").fetchone()["n"],
+            "lookups": lookups,
+            "hits": hits,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "audio_seconds_reused": stats.get("audio_seconds_reused", 0.0),
+            "worker_seconds_saved": stats.get("worker_seconds_saved", 0.0),
+            # Fingerprinting cost relative to the audio it covered
+            "fingerprint_seconds_per_audio_second":
+                stats.get("fingerprint_seconds", 0.0) / stats["audio_seconds"] if stats.get("audio_seconds") else 0.0,
+        }
+
+def reuse_segments(match: dict, duration: float) -> tuple[str, str, list] | None:
+    """
+    Take the transcript of a matched video, cut to the query's time range
+    when the query is a clip of it.
+
+    Returns:
+        tuple | None: (transcript, language, segments) with times relative
+            to the query, or None if the matched video's files are gone
+    """
+    segments_path = file_manager.get_file_path(match["video_id"], "segments")
+    if not os.path.exists(segments_path):
+        return None
+
+    offset = match["offset"]
+    with SegmentIndex(segments_path) as index:
+        language = index.language
+        segments = []
+        for i in index.find(offset, offset + duration):
+            segment = index[i]
+            segments.append({"start": max(0.0, segment["start"] - offset),
+                             "end": min(duration, segment["end"] - offset),
+                             "text": segment["text"]})
+    return " ".join(segment["text"] for segment in segments), language, segments
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index() -> FingerprintIndex:
+    """Return the process-wide fingerprint index at FINGERPRINT_DB (default fingerprints.sqlite3)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FingerprintIndex(os.getenv("FINGERPRINT_DB", "fingerprints.sqlite3"))
+        return _index
+
+def dedup_enabled() -> bool:
+    """Whether to look for already transcribed copies of the audio (AUDIO_DEDUP, default on)."""
+    return os.getenv("AUDIO_DEDUP", "1").lower() not in ("0", "false", "no", "off")
+
+def find_duplicate(audio_path: str, video_id: str, model_size: str = "base",
+                   backend: str = "whisper") -> tuple:
+    """
+    Fingerprint an audio file and look for a processed video with the same audio.
+
+    Every lookup is counted in the dedup metrics, together with the worker
+    time a hit saves.
+
+    Returns:
+        tuple: (fingerprint, duration in seconds, duplicate), where duplicate
+            is None or the match (see FingerprintIndex.search) plus its
+            `transcript`, `language` and `segments`
+    """
+    from .transcription import load_audio, SAMPLE_RATE
+    from .scheduler import estimate_cost
+
+    started = time.perf_counter()
+    audio = load_audio(audio_path)
+    duration = len(audio) / SAMPLE_RATE
+    fingerprint = fingerprint_audio(audio)
+    index = get_index()
+    duplicate = None
+    match = index.search(fingerprint, exclude=video_id) if len(fingerprint) else None
+    if match:
+        reused = reuse_segments(match, duration)
+        if reused is None:
+            # The matched video's files have been cleaned up since
+            index.remove(match["video_id"])
+        else:
+            duplicate = dict(match, transcript=reused[0], language=reused[1], segments=reused[2])
+    elapsed = time.perf_counter() - started
+
+    saved = estimate_cost(duration, model_size, backend=backend) - elapsed if duplicate else 0.0
+    index.record(duplicate is not None, duration, elapsed, max(0.0, saved))
+    if duplicate:
+        logger.info(f"Audio of video {video_id} matches video {duplicate['video_id']} at "
+                    f"{duplicate['offset']:.1f}s (bit error rate {duplicate['bit_error_rate']:.3f})")
+    logger.info(f"Fingerprinted {duration:.0f}s of audio in {elapsed:.2f}s")
+    return fingerprint, duration, duplicate
@@ -0,0 +1,848 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from .database import ThreadLocalConnection
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle: queued -> running -> done | failed | cancelled. A running job
+# whose lease expires (worker crashed or lost its connection) becomes leasable
+# again until it runs out of attempts. A job is cancelled once every request
+# waiting for it has gone away (see JobQueue.release). Jobs that share a
+# group (e.g. jobs writing the files of one video) run one at a time.
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Scheduling policies. Both order jobs by a priority derived from the job's
+# cost (expected worker seconds) and a virtual clock that advances to the
+# priority of each job leased, so long jobs are not starved forever.
+#   fair: weighted fair queuing per client. A job's priority is its client's
+#         virtual finish time, so a client with a backlog of long videos
+#         cannot hold up everyone else's short ones.
+#   sjf:  shortest expected job first across all clients.
+POLICIES = ("fair", "sjf")
+
+# How long finished jobs are kept (JOB_RETENTION_HOURS)
+DEFAULT_RETENTION_SECONDS = 24 * 3600.0
+
+class QueueLimitExceeded(Exception):
+    """Raised by enqueue when a new job would exceed the queue's limits."""
+
+    def __init__(self, count: int, pending_cost: float):
+        super().__init__(f"{count} jobs ({pending_cost:.0f}s of work) already queued")
+        self.count = count
+        self.pending_cost = pending_cost
+
+def exceeds_limits(count: int, pending_cost: float, cost: float,
+                   max_jobs: int | None, max_cost: float | None) -> bool:
+    """
+    Whether a job of `cost` must be turned away with `count` jobs of
+    `pending_cost` already queued. A single job larger than the cost budget
+    is still let through when nothing else is waiting, otherwise it could
+    never run.
+    """
+    if max_jobs is not None and count >= max_jobs:
+        return True
+    return max_cost is not None and count > 0 and pending_cost + cost > max_cost
+
+def retry_delay(attempts: int) -> float:
+    """Seconds to wait before retrying a job that has failed `attempts` times."""
+    return min(300.0, 5.0 * 2 ** (attempts - 1))
+
+class JobQueue(ABC):
+    """
+    Durable queue of pipeline jobs shared by API and worker processes.
+
+    Jobs are plain dicts with the keys id, kind, payload, status, attempts,
+    max_attempts, client_id, cost, priority, waiters, cancel_requested,
+    group_id, lease_owner, lease_expires, result, error, created_at and
+    updated_at.
+    Enqueueing an id that is already queued or running returns the existing
+    job, so concurrent requests for the same video share one run.
+
+    `waiters` counts the requests sharing a job: each enqueue adds one and
+    each release drops one. When the last one is released a queued job is
+    cancelled outright, and a running one gets `cancel_requested`, which its
+    worker polls so it can stop early and then confirms with `cancel`.
+    Enqueueing the job again before that withdraws the request.
+
+    Done, failed and cancelled jobs are kept for `retention_seconds` after
+    they finish, so clients can still fetch their result (see prune).
+    """
+
+    def __init__(self, policy: str = "fair", retention_seconds: float = DEFAULT_RETENTION_SECONDS):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown scheduling policy '{policy}', expected one of {', '.join(POLICIES)}")
+        self.policy = policy
+        self.retention_seconds = retention_seconds
+        # Wakes workers in this process as soon as a job is enqueued here;
+        # workers elsewhere find it on their next poll.
+        self._changed = threading.Condition()
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def wait(self, timeout: float):
+        """Block until a job is enqueued by this process or `timeout` seconds pass."""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    @abstractmethod
+    def enqueue(self, kind: str, payload: dict, job_id: str | None = None, max_attempts: int = 3,
+                cost: float = 0.0, client_id: str = "", weight: float = 1.0,
+                max_jobs: int | None = None, max_cost: float | None = None, group_id: str = "") -> dict:
+        """
+        Add a job, charged `cost` worker seconds to `client_id`.
+
+        `weight` is the client's share under the fair policy: a client with
+        weight 2 gets twice the throughput of one with weight 1.
+
+        Every call makes the caller a waiter of the job, identified by the
+        token returned as the job's `waiter`; pass it to release() when the
+        caller stops waiting.
+
+        Jobs with the same non-empty `group_id` are never leased at the same
+        time: a queued job waits while another job of its group is running.
+
+        A new job is only added while fewer than `max_jobs` jobs are queued
+        and their cost plus `cost` stays within `max_cost` (see
+        exceeds_limits), checked atomically with the insert. Joining an
+        active job is always allowed.
+
+        Raises:
+            QueueLimitExceeded: The job is new and the queue is full
+        """
+
+    @abstractmethod
+    def lease(self, worker_id: str, lease_seconds: float = 60.0) -> dict | None:
+        """Claim the next runnable job for `worker_id`, or return None if there is none."""
+
+    @abstractmethod
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = 60.0) -> bool:
+        """Extend a lease. Returns False if the worker no longer owns the job."""
+
+    @abstractmethod
+    def complete(self, job_id: str, worker_id: str, result: dict) -> bool:
+        """Record a job's result. Returns False if the worker no longer owns the job."""
+
+    @abstractmethod
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """Record a failure; the job is re-queued with backoff while attempts remain."""
+
+    @abstractmethod
+    def release(self, job_id: str, waiter: str) -> dict | None:
+        """
+        Drop a waiter (see enqueue) from a queued or running job, cancelling
+        the job if it was the last. A waiter is only dropped once: releasing
+        an unknown or already released token changes nothing.
+        """
+
+    @abstractmethod
+    def cancel_requested(self, job_id: str) -> bool:
+        """Whether the worker running a job should stop (see release)."""
+
+    @abstractmethod
+    def cancel(self, job_id: str, worker_id: str) -> bool:
+        """
+        Mark a running job as cancelled after its worker stopped it. Returns
+        False if the worker no longer owns it, or the cancellation was
+        withdrawn in the meantime because a new request joined the job.
+        """
+
+    @abstractmethod
+    def requeue(self, job_id: str, worker_id: str) -> bool:
+        """
+        Put a running job back in the queue, runnable straight away and
+        without counting the attempt, e.g. when its worker stopped it but a
+        new request joined it before it was cancelled. Returns False if the
+        worker no longer owns it.
+        """
+
+    @abstractmethod
+    def prune(self) -> int:
+        """
+        Delete jobs that finished more than `retention_seconds` ago, with
+        their waiter tokens, and per-client scheduler state that no longer
+        affects priorities. Returns the number of jobs deleted.
+        """
+
+    @abstractmethod
+    def get(self, job_id: str) -> dict | None:
+        """The job with this id, or None."""
+
+    @abstractmethod
+    def counts(self) -> dict:
+        """Number of jobs in each state."""
+
+    @abstractmethod
+    def pending(self) -> tuple[int, float]:
+        """Number of queued (not yet running) jobs and their total cost."""
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue in a local SQLite database, for one machine or a shared volume."""
+
+    COLUMNS = {
+        "client_id": "TEXT NOT NULL DEFAULT ''",
+        "cost": "REAL NOT NULL DEFAULT 0",
+        "priority": "REAL NOT NULL DEFAULT 0",
+        "waiters": "INTEGER NOT NULL DEFAULT 1",
+        "cancel_requested": "INTEGER NOT NULL DEFAULT 0",
+        "group_id": "TEXT NOT NULL DEFAULT ''",
+    }
+
+    def __init__(self, path: str, policy: str = "fair", retention_seconds: float = DEFAULT_RETENTION_SECONDS):
+        super().__init__(policy, retention_seconds)
+        self.path = path
+        self._connect = ThreadLocalConnection(path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL DEFAULT 3,
+                    available_at REAL NOT NULL,
+                    lease_owner TEXT,
+                    lease_expires REAL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            # Columns added after the first release
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, definition in self.COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            conn.execute("DROP INDEX IF EXISTS jobs_runnable")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_priority ON jobs (status, priority)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_group ON jobs (group_id, status)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_update ON jobs (status, updated_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS scheduler_state (key TEXT PRIMARY KEY, value REAL NOT NULL)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_waiters (
+                    job_id TEXT NOT NULL,
+                    waiter TEXT NOT NULL,
+                    PRIMARY KEY (job_id, waiter)
+                )
+            """)
+
+    @staticmethod
+    def _to_dict(row) -> dict | None:
+        if row is None:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        del job["available_at"]
+        return job
+
+    @staticmethod
+    def _state(conn, key: str) -> float:
+        row = conn.execute("SELECT value FROM scheduler_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else 0.0
+
+    @staticmethod
+    def _set_state(conn, key: str, value: float):
+        conn.execute("INSERT OR REPLACE INTO scheduler_state (key, value) VALUES (?, ?)", (key, value))
+
+    def enqueue(self, kind: str, payload: dict, job_id: str | None = None, max_attempts: int = 3,
+                cost: float = 0.0, client_id: str = "", weight: float = 1.0,
+                max_jobs: int | None = None, max_cost: float | None = None, group_id: str = "") -> dict:
+        job_id = job_id or uuid.uuid4().hex
+        waiter = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row and row["status"] in (QUEUED, RUNNING):
+                conn.execute("""
+                    UPDATE jobs SET waiters = waiters + 1, cancel_requested = 0 WHERE id = ?
+                """, (job_id,))
+                conn.execute("INSERT INTO job_waiters (job_id, waiter) VALUES (?, ?)", (job_id, waiter))
+                conn.execute("COMMIT")
+                return dict(self.get(job_id), waiter=waiter)
+
+            count, pending_cost = self._pending(conn)
+            if exceeds_limits(count, pending_cost, cost, max_jobs, max_cost):
+                raise QueueLimitExceeded(count, pending_cost)
+
+            vtime = self._state(conn, "vtime")
+            if self.policy == "sjf":
+                priority = vtime + cost
+            else:
+                client_key = f"client:{client_id}"
+                priority = max(vtime, self._state(conn, client_key)) + cost / weight
+                self._set_state(conn, client_key, priority)
+
+            # A finished job with the same id is replaced so the work is redone
+            conn.execute("""
+                INSERT OR REPLACE INTO jobs (id, kind, payload, status, max_attempts, available_at,
+                    client_id, cost, priority, waiters, cancel_requested, group_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?, ?)
+            """, (job_id, kind, json.dumps(payload), QUEUED, max_attempts, now,
+                  client_id, cost, priority, group_id, now, now))
+            conn.execute("DELETE FROM job_waiters WHERE job_id = ?", (job_id,))
+            conn.execute("INSERT INTO job_waiters (job_id, waiter) VALUES (?, ?)", (job_id, waiter))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify()
+        return dict(self.get(job_id), waiter=waiter)
+
+    def lease(self, worker_id: str, lease_seconds: float = 60.0) -> dict | None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Jobs whose worker vanished and that nobody is waiting for, or
+            # that have no attempts left
+            conn.execute("""
+                UPDATE jobs SET status = ?, error = 'Cancelled', lease_owner = NULL, updated_at = ?
+                WHERE status = ? AND lease_expires < ? AND cancel_requested = 1
+            """, (CANCELLED, now, RUNNING, now))
+            conn.execute("""
+                UPDATE jobs SET status = ?, error = 'Lease expired', lease_owner = NULL, updated_at = ?
+                WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts
+            """, (FAILED, now, RUNNING, now))
+            row = conn.execute("""
+                SELECT id, priority FROM jobs AS job
+                WHERE ((status = ? AND available_at <= ?) OR (status = ? AND lease_expires < ?))
+                    AND (group_id = '' OR NOT EXISTS (
+                        SELECT 1 FROM jobs AS other
+                        WHERE other.group_id = job.group_id AND other.id != job.id
+                            AND other.status = ? AND other.lease_expires >= ?
+                    ))
+                ORDER BY priority, created_at
+                LIMIT 1
+            """, (QUEUED, now, RUNNING, now, RUNNING, now)).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute("""
+                UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE id = ?
+            """, (RUNNING, worker_id, now + lease_seconds, now, row["id"]))
+            self._set_state(conn, "vtime", max(self._state(conn, "vtime"), row["priority"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = 60.0) -> bool:
+        now = time.time()
+        cursor = self._connect().execute("""
+            UPDATE jobs SET lease_expires = ?, updated_at = ?
+            WHERE id = ? AND status = ? AND lease_owner = ?
+        """, (now + lease_seconds, now, job_id, RUNNING, worker_id))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str, result: dict) -> bool:
+        cursor = self._connect().execute("""
+            UPDATE jobs SET status = ?, result = ?, error = NULL, lease_owner = NULL,
+                lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND status = ? AND lease_owner = ?
+        """, (DONE, json.dumps(result), time.time(), job_id, RUNNING, worker_id))
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        now = time.time()
+        conn = self._connect()
+        job = self.get(job_id)
+        if job is None or job["status"] != RUNNING or job["lease_owner"] != worker_id:
+            return False
+        if retry and job["attempts"] < job["max_attempts"]:
+            status, available_at = QUEUED, now + retry_delay(job["attempts"])
+        else:
+            status, available_at = FAILED, now
+        cursor = conn.execute("""
+            UPDATE jobs SET status = ?, error = ?, available_at = ?, lease_owner = NULL,
+                lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND status = ? AND lease_owner = ?
+        """, (status, error, available_at, now, job_id, RUNNING, worker_id))
+        return cursor.rowcount == 1
+
+    def release(self, job_id: str, waiter: str) -> dict | None:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            released = conn.execute("DELETE FROM job_waiters WHERE job_id = ? AND waiter = ?",
+                                    (job_id, waiter)).rowcount == 1
+            row = conn.execute("SELECT status, waiters FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if released and row["status"] in (QUEUED, RUNNING):
+                if row["waiters"] > 1:
+                    conn.execute("UPDATE jobs SET waiters = waiters - 1 WHERE id = ?", (job_id,))
+                elif row["status"] == QUEUED:
+                    conn.execute("""
+                        UPDATE jobs SET status = ?, waiters = 0, error = 'Cancelled', updated_at = ?
+                        WHERE id = ?
+                    """, (CANCELLED, now, job_id))
+                else:
+                    conn.execute("""
+                        UPDATE jobs SET waiters = 0, cancel_requested = 1, updated_at = ? WHERE id = ?
+                    """, (now, job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._connect().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row["cancel_requested"])
+
+    def cancel(self, job_id: str, worker_id: str) -> bool:
+        cursor = self._connect().execute("""
+            UPDATE jobs SET status = ?, error = 'Cancelled', lease_owner = NULL, lease_expires = NULL,
+                updated_at = ?
+            WHERE id = ? AND status = ? AND lease_owner = ? AND cancel_requested = 1
+        """, (CANCELLED, time.time(), job_id, RUNNING, worker_id))
+        return cursor.rowcount == 1
+
+    def requeue(self, job_id: str, worker_id: str) -> bool:
+        now = time.time()
+        cursor = self._connect().execute("""
+            UPDATE jobs SET status = ?, attempts = attempts - 1, available_at = ?, error = NULL,
+                cancel_requested = 0, lease_owner = NULL, lease_expires = NULL, updated_at = ?
+            WHERE id = ? AND status = ? AND lease_owner = ?
+        """, (QUEUED, now, now, job_id, RUNNING, worker_id))
+        if cursor.rowcount != 1:
+            return False
+        self._notify()
+        return True
+
+    def prune(self) -> int:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            deleted = conn.execute("""
+                DELETE FROM jobs WHERE status IN (?, ?, ?) AND updated_at < ?
+            """, (DONE, FAILED, CANCELLED, time.time() - self.retention_seconds)).rowcount
+            # Tokens are only needed while their job is active
+            conn.execute("""
+                DELETE FROM job_waiters WHERE job_id NOT IN (SELECT id FROM jobs WHERE status IN (?, ?))
+            """, (QUEUED, RUNNING))
+            # A client whose finish time the virtual clock has passed gets the
+            # same priority with or without its entry
+            conn.execute("DELETE FROM scheduler_state WHERE key LIKE 'client:%' AND value <= ?",
+                         (self._state(conn, "vtime"),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if deleted:
+            logger.info(f"Pruned {deleted} finished jobs")
+        return deleted
+
+    def get(self, job_id: str) -> dict | None:
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def counts(self) -> dict:
+        rows = self._connect().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    @staticmethod
+    def _pending(conn) -> tuple[int, float]:
+        row = conn.execute(
+            "SELECT COUNT(*) AS n, COALESCE(SUM(cost), 0) AS cost FROM jobs WHERE status = ?", (QUEUED,)
+        ).fetchone()
+        return row["n"], row["cost"]
+
+    def pending(self) -> tuple[int, float]:
+        return self._pending(self._connect())
+
+class RedisJobQueue(JobQueue):
+    """
+    Job queue in Redis, for API and worker processes spread over several nodes.
+
+    Each job is a hash. Runnable ids sit in a sorted set scored by priority,
+    retries waiting out their backoff in one scored by the time they become
+    runnable, and leased ids in one scored by lease expiry. Scheduler state
+    (the virtual clock and per-client finish times) is a hash, and so is the
+    running job of each group. State transitions run as Lua scripts so they
+    are atomic. A finished job's hash and waiter set expire after
+    `retention_seconds`.
+    """
+
+    # Prepended to the scripts that take a job out of the running state:
+    # frees the job's group (hash `groups`) if the job holds it
+    UNLOCK_GROUP = """
+    local function unlock_group(groups, key, id)
+        local group = redis.call('HGET', key, 'group_id')
+        if group and group ~= '' and redis.call('HGET', groups, group) == id then
+            redis.call('HDEL', groups, group)
+        end
+    end
+    """
+
+    # Prepended to the scripts that finish jobs: starts the retention period
+    # of a job's hash and waiter set
+    EXPIRE_JOB = """
+    local function expire_job(key, waiters, ttl)
+        redis.call('EXPIRE', key, ttl)
+        redis.call('EXPIRE', waiters, ttl)
+    end
+    """
+
+    # KEYS: job hash, ready, state, delayed, waiters set
+    # ARGV: id, kind, payload, max_attempts, now, cost, client, weight, policy,
+    #       max jobs, max cost (empty for no limit), job key prefix, waiter, group
+    # Returns 1 when added, 0 when joined, or {count, cost} of the queued jobs
+    # when the queue is full (see exceeds_limits)
+    ENQUEUE = """
+    local status = redis.call('HGET', KEYS[1], 'status')
+    if status == 'queued' or status == 'running' then
+        redis.call('HINCRBY', KEYS[1], 'waiters', 1)
+        redis.call('HSET', KEYS[1], 'cancel_requested', 0)
+        redis.call('SADD', KEYS[5], ARGV[13])
+        return 0
+    end
+    if ARGV[10] ~= '' or ARGV[11] ~= '' then
+        local count, pending = 0, 0
+        for _, zset in ipairs({KEYS[2], KEYS[4]}) do
+            for _, id in ipairs(redis.call('ZRANGE', zset, 0, -1)) do
+                count = count + 1
+                pending = pending + tonumber(redis.call('HGET', ARGV[12] .. id, 'cost') or '0')
+            end
+        end
+        if (ARGV[10] ~= '' and count >= tonumber(ARGV[10]))
+                or (ARGV[11] ~= '' and count > 0 and pending + tonumber(ARGV[6]) > tonumber(ARGV[11])) then
+            return {count, tostring(pending)}
+        end
+    end
+    local vtime = tonumber(redis.call('HGET', KEYS[3], 'vtime') or '0')
+    local cost = tonumber(ARGV[6])
+    local priority
+    if ARGV[9] == 'sjf' then
+        priority = vtime + cost
+    else
+        local finish = tonumber(redis.call('HGET', KEYS[3], 'client:' .. ARGV[7]) or '0')
+        priority = math.max(vtime, finish) + cost / tonumber(ARGV[8])
+        redis.call('HSET', KEYS[3], 'client:' .. ARGV[7], priority)
+    end
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'id', ARGV[1], 'kind', ARGV[2], 'payload', ARGV[3], 'status', 'queued',
+        'attempts', 0, 'max_attempts', ARGV[4], 'client_id', ARGV[7], 'cost', cost, 'priority', priority,
+        'waiters', 1, 'cancel_requested', 0, 'group_id', ARGV[14], 'created_at', ARGV[5], 'updated_at', ARGV[5])
+    redis.call('DEL', KEYS[5])
+    redis.call('SADD', KEYS[5], ARGV[13])
+    redis.call('ZADD', KEYS[2], priority, ARGV[1])
+    return 1
+    """
+
+    # KEYS: ready, delayed, leases, state, groups
+    # ARGV: now, worker, lease seconds, job key prefix, waiters key prefix, retention seconds
+    LEASE = UNLOCK_GROUP + EXPIRE_JOB + """
+    local now = tonumber(ARGV[1])
+    for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', now)) do
+        redis.call('ZREM', KEYS[2], id)
+        redis.call('ZADD', KEYS[1], redis.call('HGET', ARGV[4] .. id, 'priority'), id)
+    end
+    for _, id in ipairs(redis.call('ZRANGEBYSCORE', KEYS[3], '-inf', now)) do
+        local key = ARGV[4] .. id
+        redis.call('ZREM', KEYS[3], id)
+        unlock_group(KEYS[5], key, id)
+        if redis.call('HGET', key, 'cancel_requested') == '1' then
+            redis.call('HSET', key, 'status', 'cancelled', 'error', 'Cancelled', 'lease_owner', '', 'updated_at', now)
+            expire_job(key, ARGV[5] .. id, ARGV[6])
+        elseif tonumber(redis.call('HGET', key, 'attempts')) >= tonumber(redis.call('HGET', key, 'max_attempts')) then
+            redis.call('HSET', key, 'status', 'failed', 'error', 'Lease expired', 'lease_owner', '', 'updated_at', now)
+            expire_job(key, ARGV[5] .. id, ARGV[6])
+        else
+            redis.call('HSET', key, 'status', 'queued', 'lease_owner', '', 'updated_at', now)
+            redis.call('ZADD', KEYS[1], redis.call('HGET', key, 'priority'), id)
+        end
+    end
+    local id, key, group
+    for _, candidate in ipairs(redis.call('ZRANGE', KEYS[1], 0, -1)) do
+        key = ARGV[4] .. candidate
+        group = redis.call('HGET', key, 'group_id')
+        if not group or group == '' or not redis.call('HGET', KEYS[5], group) then
+            id = candidate
+            break
+        end
+    end
+    if not id then return false end
+    if group and group ~= '' then
+        redis.call('HSET', KEYS[5], group, id)
+    end
+    local expires = now + tonumber(ARGV[3])
+    redis.call('ZREM', KEYS[1], id)
+    redis.call('ZADD', KEYS[3], expires, id)
+    redis.call('HINCRBY', key, 'attempts', 1)
+    redis.call('HSET', key, 'status', 'running', 'lease_owner', ARGV[2], 'lease_expires', expires, 'updated_at', now)
+    local priority = tonumber(redis.call('HGET', key, 'priority'))
+    if priority > tonumber(redis.call('HGET', KEYS[4], 'vtime') or '0') then
+        redis.call('HSET', KEYS[4], 'vtime', priority)
+    end
+    return id
+    """
+
+    # KEYS: job hash, leases, delayed, groups, waiters set; ARGV: worker, new
+    # status, now, lease expiry or time the retry becomes runnable, field,
+    # value, retention seconds. Only the lease owner may transition a job, and
+    # only cancel it while that is requested.
+    TRANSITION = UNLOCK_GROUP + EXPIRE_JOB + """
+    if redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[1] or redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+        return 0
+    end
+    if ARGV[2] == 'cancelled' and redis.call('HGET', KEYS[1], 'cancel_requested') ~= '1' then
+        return 0
+    end
+    local id = redis.call('HGET', KEYS[1], 'id')
+    if ARGV[2] == 'running' then
+        redis.call('HSET', KEYS[1], 'lease_expires', ARGV[4], 'updated_at', ARGV[3])
+        redis.call('ZADD', KEYS[2], ARGV[4], id)
+        return 1
+    end
+    redis.call('ZREM', KEYS[2], id)
+    unlock_group(KEYS[4], KEYS[1], id)
+    redis.call('HSET', KEYS[1], 'status', ARGV[2], 'lease_owner', '', 'updated_at', ARGV[3], ARGV[5], ARGV[6])
+    if ARGV[2] == 'queued' then
+        redis.call('ZADD', KEYS[3], ARGV[4], id)
+    else
+        expire_job(KEYS[1], KEYS[5], ARGV[7])
+    end
+    return 1
+    """
+
+    # KEYS: job hash, ready, delayed, waiters set; ARGV: now, waiter, retention seconds
+    RELEASE = EXPIRE_JOB + """
+    local status = redis.call('HGET', KEYS[1], 'status')
+    if status ~= 'queued' and status ~= 'running' then return 0 end
+    if redis.call('SREM', KEYS[4], ARGV[2]) == 0 then return 0 end
+    if redis.call('HINCRBY', KEYS[1], 'waiters', -1) > 0 then return 1 end
+    local id = redis.call('HGET', KEYS[1], 'id')
+    redis.call('HSET', KEYS[1], 'waiters', 0, 'updated_at', ARGV[1])
+    if status == 'queued' then
+        redis.call('ZREM', KEYS[2], id)
+        redis.call('ZREM', KEYS[3], id)
+        redis.call('HSET', KEYS[1], 'status', 'cancelled', 'error', 'Cancelled')
+        expire_job(KEYS[1], KEYS[4], ARGV[3])
+    else
+        redis.call('HSET', KEYS[1], 'cancel_requested', 1)
+    end
+    return 1
+    """
+
+    # KEYS: job hash, leases, ready, groups; ARGV: worker, now
+    REQUEUE = UNLOCK_GROUP + """
+    if redis.call('HGET', KEYS[1], 'lease_owner') ~= ARGV[1] or redis.call('HGET', KEYS[1], 'status') ~= 'running' then
+        return 0
+    end
+    local id = redis.call('HGET', KEYS[1], 'id')
+    redis.call('ZREM', KEYS[2], id)
+    unlock_group(KEYS[4], KEYS[1], id)
+    redis.call('HINCRBY', KEYS[1], 'attempts', -1)
+    redis.call('HSET', KEYS[1], 'status', 'queued', 'lease_owner', '', 'error', '', 'cancel_requested', 0,
+        'updated_at', ARGV[2])
+    redis.call('ZADD', KEYS[3], redis.call('HGET', KEYS[1], 'priority'), id)
+    return 1
+    """
+
+    # KEYS: state. Drops the finish times of clients the virtual clock has
+    # passed, which give the same priority with or without their entry.
+    PRUNE_CLIENTS = """
+    local vtime = tonumber(redis.call('HGET', KEYS[1], 'vtime') or '0')
+    local fields = redis.call('HGETALL', KEYS[1])
+    local removed = 0
+    for i = 1, #fields, 2 do
+        if string.sub(fields[i], 1, 7) == 'client:' and tonumber(fields[i + 1]) <= vtime then
+            redis.call('HDEL', KEYS[1], fields[i])
+            removed = removed + 1
+        end
+    end
+    return removed
+    """
+
+    # KEYS: ready, delayed; ARGV: job key prefix
+    PENDING = """
+    local count, cost = 0, 0
+    for _, zset in ipairs(KEYS) do
+        for _, id in ipairs(redis.call('ZRANGE', zset, 0, -1)) do
+            count = count + 1
+            cost = cost + tonumber(redis.call('HGET', ARGV[1] .. id, 'cost') or '0')
+        end
+    end
+    return {count, tostring(cost)}
+    """
+
+    def __init__(self, url: str, policy: str = "fair", prefix: str = "voxtora:jobs:",
+                 retention_seconds: float = DEFAULT_RETENTION_SECONDS):
+        import redis
+
+        super().__init__(policy, retention_seconds)
+        self.redis = redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.ready_key = f"{prefix}ready"
+        self.delayed_key = f"{prefix}delayed"
+        self.leases_key = f"{prefix}leases"
+        self.state_key = f"{prefix}scheduler"
+        self.groups_key = f"{prefix}groups"
+        self._enqueue = self.redis.register_script(self.ENQUEUE)
+        self._lease = self.redis.register_script(self.LEASE)
+        self._transition = self.redis.register_script(self.TRANSITION)
+        self._release = self.redis.register_script(self.RELEASE)
+        self._requeue = self.redis.register_script(self.REQUEUE)
+        self._pending = self.redis.register_script(self.PENDING)
+        self._prune_clients = self.redis.register_script(self.PRUNE_CLIENTS)
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}job:{job_id}"
+
+    def _waiters_key(self, job_id: str) -> str:
+        return f"{self.prefix}waiters:{job_id}"
+
+    @property
+    def _ttl(self) -> int:
+        return max(1, int(self.retention_seconds))
+
+    def enqueue(self, kind: str, payload: dict, job_id: str | None = None, max_attempts: int = 3,
+                cost: float = 0.0, client_id: str = "", weight: float = 1.0,
+                max_jobs: int | None = None, max_cost: float | None = None, group_id: str = "") -> dict:
+        job_id = job_id or uuid.uuid4().hex
+        waiter = uuid.uuid4().hex
+        added = self._enqueue(keys=[self._key(job_id), self.ready_key, self.state_key, self.delayed_key,
+                                    self._waiters_key(job_id)],
+                              args=[job_id, kind, json.dumps(payload), max_attempts, time.time(),
+                                    cost, client_id, weight, self.policy,
+                                    "" if max_jobs is None else max_jobs,
+                                    "" if max_cost is None else max_cost, f"{self.prefix}job:", waiter,
+                                    group_id])
+        if isinstance(added, list):
+            raise QueueLimitExceeded(int(added[0]), float(added[1]))
+        self._notify()
+        return dict(self.get(job_id), waiter=waiter)
+
+    def lease(self, worker_id: str, lease_seconds: float = 60.0) -> dict | None:
+        job_id = self._lease(keys=[self.ready_key, self.delayed_key, self.leases_key, self.state_key,
+                                   self.groups_key],
+                             args=[time.time(), worker_id, lease_seconds, f"{self.prefix}job:",
+                                   f"{self.prefix}waiters:", self._ttl])
+        return self.get(job_id) if job_id else None
+
+    def _transition_job(self, job_id: str, worker_id: str, status: str, at: float, field: str, value: str) -> bool:
+        return bool(self._transition(keys=[self._key(job_id), self.leases_key, self.delayed_key, self.groups_key,
+                                           self._waiters_key(job_id)],
+                                     args=[worker_id, status, time.time(), at, field, value, self._ttl]))
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float = 60.0) -> bool:
+        return self._transition_job(job_id, worker_id, RUNNING, time.time() + lease_seconds, "error", "")
+
+    def complete(self, job_id: str, worker_id: str, result: dict) -> bool:
+        return self._transition_job(job_id, worker_id, DONE, time.time(), "result", json.dumps(result))
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        job = self.get(job_id)
+        if job is None:
+            return False
+        now = time.time()
+        if retry and job["attempts"] < job["max_attempts"]:
+            status, available_at = QUEUED, now + retry_delay(job["attempts"])
+        else:
+            status, available_at = FAILED, now
+        return self._transition_job(job_id, worker_id, status, available_at, "error", error)
+
+    def release(self, job_id: str, waiter: str) -> dict | None:
+        self._release(keys=[self._key(job_id), self.ready_key, self.delayed_key, self._waiters_key(job_id)],
+                      args=[time.time(), waiter, self._ttl])
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return self.redis.hget(self._key(job_id), "cancel_requested") == "1"
+
+    def cancel(self, job_id: str, worker_id: str) -> bool:
+        return self._transition_job(job_id, worker_id, CANCELLED, time.time(), "error", "Cancelled")
+
+    def requeue(self, job_id: str, worker_id: str) -> bool:
+        requeued = self._requeue(keys=[self._key(job_id), self.leases_key, self.ready_key, self.groups_key],
+                                 args=[worker_id, time.time()])
+        if requeued:
+            self._notify()
+        return bool(requeued)
+
+    def prune(self) -> int:
+        # Finished jobs expire on their own; only the scheduler state needs trimming
+        self._prune_clients(keys=[self.state_key])
+        return 0
+
+    def get(self, job_id: str) -> dict | None:
+        data = self.redis.hgetall(self._key(job_id))
+        if not data:
+            return None
+        return {
+            "id": data["id"],
+            "kind": data["kind"],
+            "payload": json.loads(data["payload"]),
+            "status": data["status"],
+            "attempts": int(data.get("attempts", 0)),
+            "max_attempts": int(data.get("max_attempts", 3)),
+            "client_id": data.get("client_id", ""),
+            "cost": float(data.get("cost", 0)),
+            "priority": float(data.get("priority", 0)),
+            "waiters": int(data.get("waiters", 1)),
+            "cancel_requested": data.get("cancel_requested") == "1",
+            "group_id": data.get("group_id", ""),
+            "lease_owner": data.get("lease_owner") or None,
+            "lease_expires": float(data["lease_expires"]) if data.get("lease_expires") else None,
+            "result": json.loads(data["result"]) if data.get("result") else None,
+            "error": data.get("error") or None,
+            "created_at": float(data["created_at"]),
+            "updated_at": float(data["updated_at"]),
+        }
+
+    def counts(self) -> dict:
+        counts = {}
+        for key in self.redis.scan_iter(f"{self.prefix}job:*"):
+            status = self.redis.hget(key, "status")
+            counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def pending(self) -> tuple[int, float]:
+        count, cost = self._pending(keys=[self.ready_key, self.delayed_key], args=[f"{self.prefix}job:"])
+        return int(count), float(cost)
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_queue() -> JobQueue:
+    """
+    Return the process-wide job queue configured by JOB_QUEUE_URL,
+    SCHEDULING_POLICY (fair or sjf, default fair) and JOB_RETENTION_HOURS
+    (how long finished jobs are kept, default 24).
+
+    - sqlite:///path/to/jobs.sqlite3 (default: sqlite:///jobs.sqlite3)
+    - redis://host:6379/0
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            url = os.getenv("JOB_QUEUE_URL", "sqlite:///jobs.sqlite3")
+            policy = os.getenv("SCHEDULING_POLICY", "fair")
+            retention = float(os.getenv("JOB_RETENTION_HOURS", "24")) * 3600
+            if url.startswith("sqlite:///"):
+                _queue = SQLiteJobQueue(url[len("sqlite:///"):], policy, retention)
+            elif url.startswith(("redis://", "rediss://", "unix://")):
+                _queue = RedisJobQueue(url, policy, retention_seconds=retention)
+            else:
+                raise ValueError(f"Unsupported JOB_QUEUE_URL: {url}")
+            logger.info(f"Using job queue {url} with {policy} scheduling")
+        return _queue
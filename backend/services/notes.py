@@ -1,61 +1,205 @@
+import asyncio
 import logging
 import os
-import requests
 import json
+from .translation import split_text
+from .cancellation import CancelToken
 
 logger = logging.getLogger(__name__)
 
+MODEL = "mistralai/mistral-7b-instruct"
+
+# Seconds to wait for OpenRouter before giving up, so a stalled connection
+# fails the attempt (and the job is retried) instead of holding the worker
+REQUEST_TIMEOUT = float(os.getenv("OPENROUTER_TIMEOUT", "120"))
+
+def _complete(prompt: str) -> str:
+    """Send one chat completion request to OpenRouter and return the reply."""
+    import requests
+
+    # Get API key from environment
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        raise Exception(
+            "OPENROUTER_API_KEY environment variable not set. "
+            "Please create a .env file in the backend directory with your OpenRouter API key. "
+            "Get your API key from https://openrouter.ai/"
+        )
+
+    # Make API request
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json"
+    }
+
+    data = {
+        "model": MODEL,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 2000
+    }
+
+    base_url = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+    response = requests.post(
+        f"{base_url}/chat/completions",
+        headers=headers,
+        json=data,
+        timeout=REQUEST_TIMEOUT
+    )
+
+    if response.status_code != 200:
+        raise Exception(f"OpenRouter API error: {response.text}")
+
+    result = response.json()
+    return result['choices'][0]['message']['content']
+
+FORMAT_GUIDELINES = """Formatting Guidelines:
+1. Main Headings: Use '###' prefix (e.g., "### Section 1: Introduction")
+2. Sub-headings: Use '##' prefix (e.g., "## Key Concepts")
+3. Content: Start with a single space after headings
+4. Code Blocks: Use triple backticks with language specification
+5. Lists: Use '--' for bullet points, no extra line breaks between items
+6. Spacing:
+   - One blank line between main sections
+   - No extra lines between related content
+   - One blank line before and after code blocks
+   - No extra lines between list items"""
+
 def generate_notes(transcript: str, target_language: str = "en") -> str:
     """Generate concise notes from transcript using OpenRouter API in the requested language."""
     try:
         logger.info(f"Generating notes from transcript in {target_language}...")
         
-        # Get API key from environment
-        api_key = os.getenv("OPENROUTER_API_KEY")
-        if not api_key:
-            raise Exception(
-                "OPENROUTER_API_KEY environment variable not set. "
-                "Please create a .env file in the backend directory with your OpenRouter API key. "
-                "Get your API key from https://openrouter.ai/"
-            )
-            
-        # Choose model
-        model = "mistralai/mistral-7b-instruct"
-        
         # Prepare the prompt
-        prompt = f"""Please create detailed ,lengthy, well-structured notes from this video transcript. \
-        Focus on key concepts, examples, and important points that transcript is talking about. Format the output with clear hierarchy and minimal spacing.\n\n        Generate the notes in {target_language}. All headings, bullet points, and explanations should be in {target_language}.\n\n        Formatting Guidelines:\n        1. Main Headings: Use '###' prefix (e.g., \"### Section 1: Introduction\")\n        2. Sub-headings: Use '##' prefix (e.g., \"## Key Concepts\")\n        3. Content: Start with a single space after headings\n        4. Code Blocks: Use triple backticks with language specification\n        5. Lists: Use '--' for bullet points, no extra line breaks between items\n        6. Spacing:\n           - One blank line between main sections\n           - No extra lines between related content\n           - One blank line before and after code blocks\n           - No extra lines between list items\n\n        Transcript:\n        {transcript}\n        \n        Please include:\n        - Clear hierarchical structure with main and sub-headings\n        - Bullet points for key concepts\n        - Code examples if applicable\n        """
-        
-        # Make API request
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
-        
-        response = requests.post(
-            "https://openrouter.ai/api/v1/chat/completions",
-            headers=headers,
-            json=data
-        )
+        prompt = f"""Please create detailed, lengthy, well-structured notes from this video transcript. \
+Focus on key concepts, examples, and important points that transcript is talking about. \
+Format the output with clear hierarchy and minimal spacing.
+
+Generate the notes in {target_language}. All headings, bullet points, and explanations should be in {target_language}.
+
+{FORMAT_GUIDELINES}
+
+Transcript:
+{transcript}
+
+Please include:
+- Clear hierarchical structure with main and sub-headings
+- Bullet points for key concepts
+- Code examples if applicable
+"""
         
-        if response.status_code != 200:
-            raise Exception(f"OpenRouter API error: {response.text}")
-            
-        result = response.json()
-        notes = result['choices'][0]['message']['content']
+        notes = _complete(prompt)
         
         logger.info("Notes generation completed successfully")
         return notes
         
     except Exception as e:
         logger.error(f"Error in generate_notes: {str(e)}")
-        raise Exception(f"Notes generation failed: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Notes generation failed: {str(e)}")
+
+# Long transcripts are drafted in sections of about this many characters,
+# each as soon as its text is available, and the drafts merged at the end
+SECTION_CHARS = int(os.getenv("NOTES_SECTION_CHARS", "8000"))
+
+def draft_section_notes(section: str, number: int, target_language: str = "en") -> str:
+    """Draft notes for one section of a longer transcript."""
+    try:
+        logger.info(f"Drafting notes for section {number} in {target_language}...")
+        prompt = f"""These are consecutive excerpts of a longer video transcript; this is part {number}. \
+Create detailed, well-structured notes for this part only, covering its key concepts, examples and \
+important points. Do not add an introduction or conclusion for the whole video.
+
+Generate the notes in {target_language}. All headings, bullet points, and explanations should be in {target_language}.
+
+{FORMAT_GUIDELINES}
+
+Transcript part {number}:
+{section}
+"""
+        return _complete(prompt)
+    except Exception as e:
+        logger.error(f"Error in draft_section_notes: {str(e)}")
+        raise Exception(f"Notes generation failed: {str(e)}")
+
+def merge_notes(drafts: list, target_language: str = "en") -> str:
+    """Merge per-section note drafts into one set of notes."""
+    try:
+        logger.info(f"Merging {len(drafts)} note drafts in {target_language}...")
+        parts = "\n\n".join(f"Part {number}:\n{draft}" for number, draft in enumerate(drafts, 1))
+        prompt = f"""Below are notes drafted separately for consecutive parts of one video transcript. \
+Merge them into a single set of detailed, well-structured notes: keep every key concept, example and \
+important point, remove repetition between parts, and number the main sections in order.
+
+Generate the notes in {target_language}. All headings, bullet points, and explanations should be in {target_language}.
+
+{FORMAT_GUIDELINES}
+
+{parts}
+"""
+        return _complete(prompt)
+    except Exception as e:
+        logger.error(f"Error in merge_notes: {str(e)}")
+        raise Exception(f"Notes generation failed: {str(e)}")
+
+async def stream_notes(texts, target_language: str = "en", section_chars: int = SECTION_CHARS,
+                       checkpoint=None, cancel: CancelToken | None = None) -> str:
+    """
+    Generate notes from transcript text as it arrives.
+
+    Each time `section_chars` characters have arrived, the complete sections
+    (cut at sentence boundaries by split_text) are drafted on worker threads
+    while the rest of the text is still being produced; the drafts are merged
+    at the end. A transcript that fits in one section gets a single
+    generate_notes call, as before.
+
+    Args:
+        texts: Async iterator of transcript text pieces
+        target_language (str): Language of the notes
+        checkpoint (Checkpoint | None): Where finished section drafts are
+            recorded, so a retried job does not draft them again
+        cancel (CancelToken | None): Checked before each LLM call
+
+    Returns:
+        str: The notes
+    """
+    drafts = []
+    buffer = ""
+    cancel = cancel or CancelToken()
+
+    async def draft_section(section: str, number: int) -> str:
+        text = checkpoint.get("draft", number, section) if checkpoint else None
+        if text is None:
+            cancel.raise_if_cancelled()
+            text = await asyncio.to_thread(draft_section_notes, section, number, target_language)
+            if checkpoint:
+                checkpoint.put("draft", number, section, text)
+        return text
+
+    def draft(section: str):
+        drafts.append(asyncio.create_task(draft_section(section, len(drafts) + 1)))
+
+    try:
+        async for text in texts:
+            buffer = f"{buffer} {text}".strip()
+            if len(buffer) > section_chars:
+                *sections, buffer = split_text(buffer, section_chars)
+                for section in sections:
+                    draft(section)
+
+        if not drafts:
+            cancel.raise_if_cancelled()
+            return await asyncio.to_thread(generate_notes, buffer, target_language)
+        if buffer:
+            draft(buffer)
+        results = await asyncio.gather(*drafts, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        cancel.raise_if_cancelled()
+        return await asyncio.to_thread(merge_notes, results, target_language)
+    except Exception:
+        # Let the drafts in flight finish, so a retry finds them checkpointed
+        await asyncio.gather(*drafts, return_exceptions=True)
+        raise
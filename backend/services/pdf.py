@@ -1,13 +1,8 @@
 import os
 import logging
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-from reportlab.lib.colors import black
-import markdown2
 import re
 from .file_manager import file_manager
+from .cancellation import CancelToken, Cancelled
 
 logger = logging.getLogger(__name__)
 
@@ -19,18 +14,25 @@ def clean_text(text: str) -> str:
     text = re.sub(r'[^\x00-\x7F]+', '', text)
     return text.strip()
 
-async def create_pdf(markdown_content: str, video_id: str) -> str:
+async def create_pdf(markdown_content: str, video_id: str, cancel: CancelToken | None = None) -> str:
     """
     Create a PDF from markdown content using reportlab.
     
     Args:
         markdown_content (str): Markdown content to convert to PDF
         video_id (str): ID of the video associated with the markdown content
+        cancel (CancelToken | None): Checked as each page is laid out
         
     Returns:
         str: Path to the created PDF file
     """
     try:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+        from reportlab.lib.enums import TA_CENTER
+        from reportlab.lib.colors import black
+
         logger.info("Starting PDF creation...")
         
         # Set output path
@@ -142,8 +144,13 @@ async def create_pdf(markdown_content: str, video_id: str) -> str:
         if current_section:
             content.extend(current_section)
         
-        # Build PDF
-        doc.build(content)
+        # Build PDF, checking for cancellation on every page
+        cancel = cancel or CancelToken()
+
+        def on_page(canvas, doc):
+            cancel.raise_if_cancelled()
+
+        doc.build(content, onFirstPage=on_page, onLaterPages=on_page)
         
         if not os.path.exists(output_path):
             raise Exception("PDF file was not created")
@@ -155,6 +162,8 @@ async def create_pdf(markdown_content: str, video_id: str) -> str:
         logger.info(f"PDF created successfully at: {output_path} (size: {file_size} bytes)")
         return output_path
         
+    except Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Error creating PDF: {str(e)}")
         raise Exception(f"Failed to create PDF: {str(e)}") 
\ No newline at end of file
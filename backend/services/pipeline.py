@@ -0,0 +1,329 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+from .file_manager import file_manager
+from .youtube import download_audio, extract_video_id, probe_video
+from .captions import fetch_captions, get_caption_policy
+from .transcription import WINDOW_SECONDS, get_backend, stream_transcription
+from .translation import translate_text, translate_stream
+from .notes import stream_notes
+from .pdf import create_pdf
+from .segments import write_segments
+from .fingerprint import dedup_enabled, find_duplicate, get_index
+from .checkpoints import Checkpoint
+from .cancellation import CancelToken
+
+logger = logging.getLogger(__name__)
+
+# Audio is not required: it is never downloaded when captions are used
+REQUIRED_FILES = ['transcript', 'notes', 'pdf']
+
+def read_meta(video_id: str) -> dict:
+    """Read the provenance recorded for a video's transcript, or {} if there is none."""
+    meta_path = file_manager.get_file_path(video_id, "meta")
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, encoding="utf-8") as f:
+        return json.load(f)
+
+def write_meta(video_id: str, meta: dict):
+    """Record how a video's transcript was produced (see run_pipeline)."""
+    meta_path = file_manager.get_file_path(video_id, "meta")
+    tmp_path = f"{meta_path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def build_result(video_id: str, target_language: str, meta: dict) -> dict:
+    """Fields of `TranscriptResponse` for a video whose files have been generated."""
+    audio_path = file_manager.get_file_path(video_id, "audio")
+    return {
+        "video_id": video_id,
+        "detected_language": meta.get("detected_language", "en"),
+        "target_language": target_language,
+        "translated": meta.get("translated", False),
+        "transcript_source": meta.get("transcript_source", "whisper"),
+        "audio_path": audio_path if os.path.exists(audio_path) else "",
+        "transcript_path": file_manager.get_file_path(video_id, "transcript"),
+        "notes_path": file_manager.get_file_path(video_id, "notes"),
+        "pdf_path": file_manager.get_file_path(video_id, "pdf"),
+    }
+
+def existing_result(video_id: str, target_language: str) -> dict | None:
+    """Return the result for a video whose files have all been generated already, else None."""
+    if not all(file_manager.file_exists(video_id, file_type) for file_type in REQUIRED_FILES):
+        return None
+    return build_result(video_id, target_language, read_meta(video_id))
+
+# Files of a cancelled or failed run are kept this long, so a new request
+# for the video can still resume from its downloaded audio and checkpoint
+ABANDONED_CLEANUP_HOURS = int(os.getenv("ABANDONED_CLEANUP_HOURS", "6"))
+
+def schedule_abandoned_cleanup(youtube_url: str, **_):
+    """Schedule removal of the files left by a run that was cancelled or failed for good."""
+    try:
+        video_id = extract_video_id(youtube_url)
+    except ValueError:
+        return
+    file_manager.schedule_cleanup(video_id, delay_hours=ABANDONED_CLEANUP_HOURS)
+
+async def run_pipeline(youtube_url: str, model_size: str = "base", target_language: str = "en",
+                       caption_policy: str | None = None, transcription_backend: str | None = None,
+                       cancel: CancelToken | None = None) -> dict:
+    """
+    Transcribe, translate and summarise a video, skipping any step whose
+    output file already exists.
+
+    When the caption policy allows it and the video has suitable captions,
+    the transcript is built from them and the audio is never downloaded.
+    When the audio matches an already transcribed video (a re-upload or a
+    clip of it), that video's transcript is reused. Otherwise translation and
+    notes run while the audio is still being transcribed (see
+    transcribe_incrementally). How the transcript was produced is recorded in
+    the video's meta file.
+
+    Steps are idempotent, so a job that is retried after a failure picks up
+    from the first missing file, and within a step from the last transcribed
+    window, translated chunk or note section recorded in the checkpoint.
+    That is also where a cancelled job resumes if it is requested again.
+
+    Args:
+        youtube_url (str): URL of the YouTube video
+        model_size (str): Whisper model size
+        target_language (str): Language code for the transcript and notes
+        caption_policy (str | None): "off", "manual" or "auto" (default: CAPTION_POLICY)
+        transcription_backend (str | None): "whisper" or "faster-whisper" (default: TRANSCRIPTION_BACKEND)
+        cancel (CancelToken | None): Stops the run at the next check inside
+            any step, by raising Cancelled
+
+    Returns:
+        dict: Fields of `TranscriptResponse`
+    """
+    # Extract video ID
+    video_id = extract_video_id(youtube_url)
+    logger.info(f"Processing video ID: {video_id}")
+    caption_policy = get_caption_policy(caption_policy)
+    backend = get_backend(transcription_backend).name
+    cancel = cancel or CancelToken()
+
+    # Check if all required files already exist
+    existing_files = {file_type: file_manager.file_exists(video_id, file_type)
+                      for file_type in REQUIRED_FILES}
+
+    if all(existing_files.values()):
+        logger.info(f"All files already exist for video {video_id}, returning existing paths")
+        return existing_result(video_id, target_language)
+
+    checkpoint = Checkpoint(video_id, {"model_size": model_size, "backend": backend,
+                                       "window_seconds": WINDOW_SECONDS, "target_language": target_language})
+
+    # Step 1: Get a transcript, from captions if possible, else from the audio
+    transcript_path = file_manager.get_file_path(video_id, "transcript")
+
+    notes = None
+    if not existing_files['transcript']:
+        captions, fingerprint = None, None
+        if caption_policy != "off":
+            try:
+                captions = fetch_captions(probe_video(youtube_url, video_id), target_language, caption_policy)
+            except Exception as e:
+                logger.warning(f"Could not look up captions for video {video_id}: {str(e)}")
+
+        if captions:
+            logger.info(f"Building transcript for video {video_id} from captions")
+            transcript, detected_lang, segments, provenance = captions
+            translated = False
+            meta = {"transcript_source": "captions", "captions": provenance}
+        else:
+            audio_path = await get_audio(youtube_url, video_id, cancel)
+            cancel.raise_if_cancelled()
+            duplicate = None
+            if dedup_enabled():
+                try:
+                    fingerprint, duration, duplicate = await asyncio.to_thread(
+                        find_duplicate, audio_path, video_id, model_size, backend
+                    )
+                except Exception as e:
+                    logger.warning(f"Could not fingerprint audio for video {video_id}: {str(e)}")
+
+            if duplicate:
+                logger.info(f"Reusing the transcript of video {duplicate['video_id']}")
+                transcript, detected_lang, segments = duplicate["transcript"], duplicate["language"], duplicate["segments"]
+                translated = False
+                meta = {"transcript_source": "duplicate", "duplicate_of": {
+                    key: duplicate[key] for key in ("video_id", "offset", "bit_error_rate")
+                }}
+            else:
+                logger.info(f"Transcribing audio for video {video_id}")
+                transcript, detected_lang, segments, translated, notes = await transcribe_incrementally(
+                    audio_path, model_size, backend, target_language, checkpoint,
+                    draft_notes=not existing_files['notes'], cancel=cancel
+                )
+                meta = {"transcript_source": "whisper", "backend": backend, "model_size": model_size}
+
+        file_manager.write_text(video_id, "transcript", transcript)
+        write_segments(file_manager.get_file_path(video_id, "segments"), segments, detected_lang)
+        meta.update(detected_language=detected_lang, translated=translated)
+        write_meta(video_id, meta)
+        if fingerprint is not None and len(fingerprint):
+            # Indexed only once the segments are written, so matches can reuse them
+            await asyncio.to_thread(get_index().add, video_id, fingerprint, duration)
+    else:
+        try:
+            transcript = read_transcript(transcript_path)
+            logger.info(f"Using existing transcript file: {transcript_path}")
+        except Exception as e:
+            logger.error(f"Error reading transcript file: {str(e)}")
+            raise Exception(f"Failed to read transcript file: {str(e)}")
+        meta = read_meta(video_id)
+        detected_lang = meta.get("detected_language", "en")
+
+    # Step 2: Translate if needed (the transcript file is overwritten, so only once)
+    if target_language != detected_lang and not meta.get("translated"):
+        logger.info(f"Translating transcript to {target_language}")
+        transcript = await translate_text(transcript, target_language, checkpoint, cancel)
+        file_manager.write_text(video_id, "transcript", transcript)
+        meta["translated"] = True
+        write_meta(video_id, meta)
+
+    # Step 3: Generate notes if needed
+    notes_path = file_manager.get_file_path(video_id, "notes")
+    if not existing_files['notes']:
+        if notes is None:
+            logger.info(f"Generating notes for video {video_id} in {target_language}")
+            notes = await stream_notes(single(transcript), target_language, checkpoint=checkpoint, cancel=cancel)
+        file_manager.write_text(video_id, "notes", notes)
+    else:
+        try:
+            notes = read_transcript(notes_path)
+            logger.info(f"Using existing notes file: {notes_path}")
+        except Exception as e:
+            logger.error(f"Error reading notes file: {str(e)}")
+            raise Exception(f"Failed to read notes file: {str(e)}")
+
+    # Step 4: Create PDF if needed
+    if not existing_files['pdf']:
+        logger.info(f"Creating PDF for video {video_id}")
+        pdf_path = await create_pdf(notes, video_id, cancel)
+    else:
+        pdf_path = file_manager.get_file_path(video_id, "pdf")
+        logger.info(f"Using existing PDF file: {pdf_path}")
+
+    checkpoint.clear()
+
+    # Schedule cleanup
+    file_manager.schedule_cleanup(video_id)
+
+    return build_result(video_id, target_language, meta)
+
+async def transcribe_incrementally(audio_path: str, model_size: str, backend: str, target_language: str,
+                                   checkpoint: Checkpoint, draft_notes: bool = True,
+                                   cancel: CancelToken | None = None) -> tuple[str, str, list, bool, str | None]:
+    """
+    Transcribe audio window by window, translating and drafting notes from
+    each window as soon as it is transcribed, so that the job takes about as
+    long as the transcription plus one final notes merge. Each finished
+    window, translated chunk and note draft is recorded in `checkpoint`.
+
+    Args:
+        audio_path (str): Path to audio file
+        model_size (str): Whisper model size
+        backend (str): Transcription backend
+        target_language (str): Language code for the transcript and notes
+        checkpoint (Checkpoint): Progress of earlier attempts at this job
+        draft_notes (bool): Whether to generate notes as well
+        cancel (CancelToken | None): Passed on to each step
+
+    Returns:
+        tuple: (transcript in the target language, detected_language,
+            segments, translated, notes or None)
+    """
+    windows = stream_transcription(audio_path, model_size, backend, checkpoint.windows(), checkpoint.add_window,
+                                   cancel)
+    # The first window decides the language, and so whether to translate
+    first_window = await anext(windows)
+    detected_lang = first_window["language"]
+    segments = []
+
+    async def source_texts():
+        window = first_window
+        while True:
+            segments.extend(window["segments"])
+            yield window["text"]
+            try:
+                window = await anext(windows)
+            except StopAsyncIteration:
+                return
+
+    translated = target_language != detected_lang
+    if translated:
+        logger.info(f"Translating transcript to {target_language} as it is transcribed")
+        texts = translate_stream(source_texts(), target_language, checkpoint=checkpoint, cancel=cancel)
+    else:
+        texts = source_texts()
+
+    parts = []
+
+    async def collected_texts():
+        async for text in texts:
+            parts.append(text)
+            yield text
+
+    notes = None
+    if draft_notes:
+        notes = await stream_notes(collected_texts(), target_language, checkpoint=checkpoint, cancel=cancel)
+    else:
+        async for _ in collected_texts():
+            pass
+    return " ".join(parts), detected_lang, segments, translated, notes
+
+async def single(text: str):
+    """Async iterator over one piece of text, for the streaming steps."""
+    yield text
+
+async def get_audio(youtube_url: str, video_id: str, cancel: CancelToken | None = None) -> str:
+    """Download the audio for a video unless it is already there."""
+    if file_manager.file_exists(video_id, "audio"):
+        audio_path = file_manager.get_file_path(video_id, "audio")
+        logger.info(f"Using existing audio file: {audio_path}")
+        return audio_path
+
+    logger.info(f"Downloading audio for video {video_id}")
+    audio_path = await download_audio(youtube_url, video_id, cancel)
+    if not os.path.exists(audio_path):
+        raise Exception("Failed to download audio file")
+    return audio_path
+
+def read_transcript(file_path: str) -> str:
+    """Read transcript file with robust encoding handling, decompressing it if needed."""
+    try:
+        # First try reading as binary
+        content = file_manager.read_bytes(file_path)
+
+        # Try to detect encoding using chardet
+        import chardet
+        detected = chardet.detect(content)
+        encoding = detected['encoding'] if detected['encoding'] else 'utf-8'
+
+        # Try detected encoding first
+        try:
+            return content.decode(encoding, errors='replace')
+        except UnicodeDecodeError:
+            pass
+
+        # If detected encoding fails, try common encodings
+        encodings = ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1', 'ascii']
+        for enc in encodings:
+            try:
+                return content.decode(enc, errors='replace')
+            except UnicodeDecodeError:
+                continue
+
+        # If all else fails, use latin-1 which can decode any byte sequence
+        return content.decode('latin-1', errors='replace')
+
+    except Exception as e:
+        logger.error(f"Error reading file: {str(e)}")
+        raise Exception(f"Failed to read file: {str(e)}")
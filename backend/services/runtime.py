@@ -0,0 +1,66 @@
+import logging
+import os
+import time
+from .file_manager import file_manager
+
+logger = logging.getLogger(__name__)
+
+_workers = []
+
+ROLES = ("all", "api", "worker")
+
+def get_role() -> str:
+    """
+    Return the process role from the APP_ROLE environment variable.
+
+    - all: serve the API and run queue workers in the same process (default)
+    - api: serve the API and enqueue jobs; never load models or run jobs
+    - worker: run queue workers only; load the Whisper model at startup
+    """
+    role = os.getenv("APP_ROLE", "all").lower()
+    if role not in ROLES:
+        raise ValueError(f"Invalid APP_ROLE '{role}', expected one of {', '.join(ROLES)}")
+    return role
+
+def startup(role: str):
+    """Initialise process-wide state for the given role."""
+    started = time.perf_counter()
+    logger.info(f"Starting in '{role}' role")
+
+    # Cleanup jobs are scheduled by whichever process produces the files
+    file_manager.start(with_scheduler=role != "api")
+
+    # Workers pay the model load up front so the first job is not slow; the
+    # combined role only does so when asked to, to keep startup fast.
+    preload = os.getenv("WHISPER_PRELOAD", "base" if role == "worker" else "")
+    if preload and role != "api":
+        from .transcription import load_model
+        load_model(preload)
+
+    if role != "api":
+        # Finished jobs are dropped from the queue once their retention is up
+        from .jobs import get_queue
+        file_manager.scheduler.add_job(get_queue().prune, 'interval', hours=1, id="prune_jobs",
+                                       replace_existing=True)
+
+        from .worker import Worker
+        concurrency = int(os.getenv("WORKER_CONCURRENCY", "1"))
+        _workers.extend(Worker().start() for _ in range(concurrency))
+        logger.info(f"Started {concurrency} queue worker(s)")
+
+    logger.info(f"Startup completed in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+def shutdown(wait: bool = False):
+    """
+    Release process-wide state created by `startup`.
+
+    With `wait`, block until running jobs finish; otherwise their leases
+    expire and another worker picks them up.
+    """
+    for worker in _workers:
+        worker.stop()
+    if wait:
+        for worker in _workers:
+            worker.thread.join()
+    _workers.clear()
+    file_manager.shutdown()
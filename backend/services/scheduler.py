@@ -0,0 +1,139 @@
+import logging
+import math
+import os
+import threading
+from .jobs import JobQueue, QueueLimitExceeded, get_queue, QUEUED, RUNNING
+
+logger = logging.getLogger(__name__)
+
+# Approximate CPU seconds of transcription per second of audio for each
+# Whisper model, used to turn a video's duration into the work it will cost
+MODEL_COST = {
+    "tiny": 0.1,
+    "base": 0.2,
+    "small": 0.6,
+    "medium": 1.5,
+    "large": 3.0,
+}
+
+# Relative speed of each transcription backend on CPU (see services/transcription.py)
+BACKEND_COST = {
+    "whisper": 1.0,
+    "faster-whisper": 0.3,
+}
+
+# Cost per second of audio when the transcript comes from existing captions
+# and nothing is transcribed
+CAPTION_COST = 0.01
+
+# Assumed duration when the video could not be probed
+DEFAULT_DURATION = 600.0
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be admitted; `retry_after` is in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def estimate_cost(duration: float | None, model_size: str = "base", captions: bool = False,
+                  backend: str = "whisper") -> float:
+    """Expected worker seconds for processing a video of `duration` seconds."""
+    rate = CAPTION_COST if captions else MODEL_COST.get(model_size, 1.0) * BACKEND_COST.get(backend, 1.0)
+    return (duration or DEFAULT_DURATION) * rate
+
+def parse_weights(value: str) -> dict:
+    """Parse CLIENT_WEIGHTS ("client=2,other=0.5") into {client: weight}."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        client, _, weight = item.partition("=")
+        weights[client.strip()] = float(weight)
+    return weights
+
+class AdmissionController:
+    """
+    Bounded admission in front of the job queue.
+
+    A job is admitted while fewer than `max_queued_jobs` are waiting and the
+    expected work of the waiting jobs stays under `max_queued_cost` seconds;
+    otherwise `QueueFullError` tells the client when to retry. Admitted jobs
+    are ordered by the queue according to SCHEDULING_POLICY (see
+    services/jobs.py), using the cost charged here.
+    """
+
+    def __init__(self, queue: JobQueue, max_queued_jobs: int, max_queued_cost: float,
+                 worker_capacity: int, weights: dict | None = None):
+        self.queue = queue
+        self.max_queued_jobs = max_queued_jobs
+        self.max_queued_cost = max_queued_cost
+        self.worker_capacity = max(1, worker_capacity)
+        self.weights = weights or {}
+
+    def retry_after(self, count: int, pending_cost: float, cost: float) -> int:
+        """Seconds until the backlog has drained enough for a job of `cost` to fit."""
+        if count >= self.max_queued_jobs:
+            # Wait for roughly one queued job to be picked up
+            wait = pending_cost / max(count, 1) / self.worker_capacity
+        else:
+            wait = (pending_cost + cost - self.max_queued_cost) / self.worker_capacity
+        return int(min(3600, max(1, math.ceil(wait))))
+
+    def check_capacity(self, job_id: str, client_id: str):
+        """
+        Cheap early rejection, before the caller spends time working out a
+        job's cost: fail if the job is new and the queue already holds
+        max_queued_jobs jobs. admit() still makes the authoritative check.
+
+        Raises:
+            QueueFullError: The queue is full
+        """
+        existing = self.queue.get(job_id)
+        if existing and existing["status"] in (QUEUED, RUNNING):
+            return
+        count, pending_cost = self.queue.pending()
+        if count >= self.max_queued_jobs:
+            raise self._reject(job_id, client_id, count, pending_cost, 0.0)
+
+    def admit(self, kind: str, payload: dict, job_id: str, cost: float, client_id: str,
+              group_id: str = "") -> dict:
+        """
+        Enqueue a job if there is room for it.
+
+        The limits are checked by the queue in the same transaction as the
+        insert, so concurrent admissions cannot overfill it. Joining a job
+        that is already queued or running is always allowed, since it adds no
+        work; the caller becomes one more of its waiters.
+
+        Raises:
+            QueueFullError: The queue is full
+        """
+        try:
+            return self.queue.enqueue(kind, payload, job_id=job_id, cost=cost, client_id=client_id,
+                                      weight=self.weights.get(client_id, 1.0),
+                                      max_jobs=self.max_queued_jobs, max_cost=self.max_queued_cost,
+                                      group_id=group_id)
+        except QueueLimitExceeded as e:
+            raise self._reject(job_id, client_id, e.count, e.pending_cost, cost)
+
+    def _reject(self, job_id: str, client_id: str, count: int, pending_cost: float, cost: float) -> QueueFullError:
+        retry_after = self.retry_after(count, pending_cost, cost)
+        logger.warning(f"Rejecting job {job_id} from {client_id}: {count} jobs "
+                       f"({pending_cost:.0f}s of work) queued, retry after {retry_after}s")
+        return QueueFullError("Too many videos are queued, please try again later", retry_after)
+
+_admission = None
+_admission_lock = threading.Lock()
+
+def get_admission() -> AdmissionController:
+    """Return the process-wide admission controller configured from the environment."""
+    global _admission
+    with _admission_lock:
+        if _admission is None:
+            _admission = AdmissionController(
+                get_queue(),
+                max_queued_jobs=int(os.getenv("MAX_QUEUED_JOBS", "20")),
+                max_queued_cost=float(os.getenv("MAX_QUEUED_COST", "14400")),
+                worker_capacity=int(os.getenv("WORKER_CAPACITY", os.getenv("WORKER_CONCURRENCY", "1"))),
+                weights=parse_weights(os.getenv("CLIENT_WEIGHTS", "")),
+            )
+        return _admission
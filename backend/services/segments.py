@@ -0,0 +1,156 @@
+import logging
+import mmap
+import os
+import threading
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger(__name__)
+
+# Segment file layout (all little-endian):
+#   header   magic "VXSG", version u16, reserved u16, segment count u32,
+#            text blob length u32, language code (8 bytes, NUL padded)
+#   starts   float32[count]    segment start times in seconds
+#   ends     float32[count]    segment end times in seconds
+#   offsets  uint32[count + 1] byte offsets of each segment's text in the blob
+#   blob     UTF-8 text of all segments, concatenated
+# Time lookups binary-search the memory-mapped arrays, so reading a range
+# touches only the pages it needs instead of loading the whole transcript.
+MAGIC = b"VXSG"
+VERSION = 1
+HEADER = struct.Struct("<4sHHII8s")
+
+def write_segments(path: str, segments: list, language: str = "") -> str:
+    """
+    Write transcript segments to `path` in the compact segment format.
+
+    Args:
+        path (str): Output file path
+        segments (list): Dicts with `start`, `end` (seconds) and `text`, in time order
+        language (str): Language code of the segment text
+
+    Returns:
+        str: The path written
+    """
+    starts = array("f", (float(segment["start"]) for segment in segments))
+    ends = array("f", (float(segment["end"]) for segment in segments))
+    texts = [segment["text"].strip().encode("utf-8") for segment in segments]
+    offsets = array("I", [0])
+    for text in texts:
+        offsets.append(offsets[-1] + len(text))
+
+    if sys.byteorder != "little":
+        for values in (starts, ends, offsets):
+            values.byteswap()
+
+    header = HEADER.pack(MAGIC, VERSION, 0, len(segments), offsets[-1], language.encode("ascii")[:8])
+    tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "wb") as f:
+        f.write(header)
+        f.write(starts.tobytes())
+        f.write(ends.tobytes())
+        f.write(offsets.tobytes())
+        for text in texts:
+            f.write(text)
+    os.replace(tmp_path, path)
+    return path
+
+class SegmentIndex:
+    """Read-only, memory-mapped view of a segment file. Use as a context manager."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap cannot map an empty file
+            self._file.close()
+            raise ValueError(f"Empty segment file: {path}")
+
+        magic, version, _, count, blob_length, language = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"Not a segment file: {path}")
+        self.language = language.rstrip(b"\0").decode("ascii")
+        self.count = count
+
+        view = memoryview(self._map)
+        position = HEADER.size
+        arrays = []
+        for typecode, length in (("f", count), ("f", count), ("I", count + 1)):
+            size = length * 4
+            arrays.append(self._array(view[position:position + size], typecode))
+            position += size
+        self.starts, self.ends, self.offsets = arrays
+        self._blob = view[position:position + blob_length]
+        self._view = view
+
+    @staticmethod
+    def _array(buffer: memoryview, typecode: str):
+        if sys.byteorder == "little":
+            return buffer.cast(typecode)
+        # Big-endian hosts cannot use the mapped bytes directly
+        values = array(typecode, buffer.tobytes())
+        values.byteswap()
+        return values
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> dict:
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        text = bytes(self._blob[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+        # float32 has sub-millisecond precision at these magnitudes; round off the noise
+        return {"index": index, "start": round(self.starts[index], 3), "end": round(self.ends[index], 3),
+                "text": text}
+
+    def find(self, start: float | None = None, end: float | None = None) -> range:
+        """Indices of the segments that overlap the [start, end) time range in seconds."""
+        first = bisect_right(self.ends, start) if start is not None else 0
+        last = bisect_left(self.starts, end) if end is not None else self.count
+        return range(first, max(first, last))
+
+    def close(self):
+        for name in ("starts", "ends", "offsets", "_blob", "_view"):
+            value = self.__dict__.pop(name, None)
+            if isinstance(value, memoryview):
+                value.release()
+        if getattr(self, "_map", None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def format_timestamp(seconds: float, separator: str = ".") -> str:
+    """Format seconds as HH:MM:SS.mmm (SRT uses ',' as the separator)."""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+def iter_subtitles(path: str, subtitle_format: str = "srt"):
+    """
+    Yield a segment file as SRT or WebVTT, one cue at a time.
+
+    Args:
+        path (str): Segment file path
+        subtitle_format (str): "srt" or "vtt"
+    """
+    separator = "," if subtitle_format == "srt" else "."
+    with SegmentIndex(path) as index:
+        if subtitle_format == "vtt":
+            yield f"WEBVTT\nLanguage: {index.language}\n\n" if index.language else "WEBVTT\n\n"
+        for number in range(len(index)):
+            segment = index[number]
+            timing = f"{format_timestamp(segment['start'], separator)} --> {format_timestamp(segment['end'], separator)}"
+            cue_id = f"{number + 1}\n" if subtitle_format == "srt" else ""
+            yield f"{cue_id}{timing}\n{segment['text']}\n\n"
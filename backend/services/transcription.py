@@ -1,59 +1,342 @@
-import whisper
+import asyncio
 import logging
-import torch
-import numpy as np
-import soundfile as sf
+import os
+import threading
+from abc import ABC, abstractmethod
+from .cancellation import CancelToken, Cancelled
+
+# whisper, torch, numpy and soundfile are imported inside the functions that
+# need them: together they take seconds to import, and API processes that only
+# serve downloads should never pay for them.
 
 logger = logging.getLogger(__name__)
 
-def transcribe_audio(audio_path: str, model_size: str = "base") -> tuple[str, str]:
+SAMPLE_RATE = 16000
+
+# Audio is transcribed in windows of about this many seconds so that
+# downstream steps can start on the first window while later ones are still
+# being transcribed; 0 transcribes the whole file at once.
+WINDOW_SECONDS = float(os.getenv("TRANSCRIBE_WINDOW_SECONDS", "120"))
+# Windows are cut at the quietest 100 ms frame within the last few seconds,
+# so words are not split across windows
+CUT_SEARCH_SECONDS = 5.0
+CUT_FRAME_SECONDS = 0.1
+# Characters of the previous window passed as the prompt for the next one
+PROMPT_CHARS = 200
+
+def load_audio(audio_path: str):
+    """Read an audio file as mono float32 samples at 16 kHz, peak-normalised."""
+    import numpy as np
+    import soundfile as sf
+
+    logger.info("Loading audio file...")
+    # Load audio using soundfile
+    audio, sample_rate = sf.read(audio_path)
+
+    # Convert to mono if stereo
+    if len(audio.shape) > 1:
+        audio = audio.mean(axis=1)
+
+    # Resample to 16kHz if needed
+    if sample_rate != SAMPLE_RATE:
+        import torch
+        audio = torch.from_numpy(audio).float()
+        audio = torch.nn.functional.interpolate(
+            audio.unsqueeze(0).unsqueeze(0),
+            size=int(len(audio) * SAMPLE_RATE / sample_rate),
+            mode='linear'
+        ).squeeze().numpy()
+
+    # Convert to float32
+    audio = audio.astype(np.float32)
+
+    # Normalize audio
+    return audio / np.max(np.abs(audio))
+
+class TranscriptionBackend(ABC):
+    """
+    A speech-to-text engine. Subclasses load models of the Whisper sizes
+    (tiny, base, small, medium, large) and transcribe 16 kHz mono audio.
+
+    Models are loaded once per process and reused for later calls.
+    """
+
+    name = ""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @abstractmethod
+    def _load(self, model_size: str):
+        """Load a model of the given size."""
+
+    def load_model(self, model_size: str = "base"):
+        with self._lock:
+            if model_size not in self._models:
+                logger.info(f"Loading {self.name} {model_size} model...")
+                self._models[model_size] = self._load(model_size)
+            return self._models[model_size]
+
+    @abstractmethod
+    def transcribe(self, audio, model_size: str = "base", language: str | None = None,
+                   initial_prompt: str | None = None) -> tuple[str, str, list]:
+        """
+        Transcribe audio samples.
+
+        Args:
+            audio: float32 numpy array of 16 kHz mono samples
+            model_size (str): Model size
+            language (str | None): Language of the audio, detected if None
+            initial_prompt (str | None): Preceding text, for continuity across windows
+
+        Returns:
+            tuple[str, str, list]: (transcript, detected_language, segments)
+        """
+
+class WhisperBackend(TranscriptionBackend):
+    """
+    openai-whisper on PyTorch, fp32 on CPU.
+
+    A model decodes one input at a time: openai-whisper keeps its KV cache in
+    forward hooks installed on the shared model, so two threads decoding at
+    once would corrupt each other's output. Worker threads of one process
+    take turns on each model; run more worker processes to decode in parallel.
+    """
+
+    name = "whisper"
+
+    def __init__(self):
+        super().__init__()
+        self._decode_locks = {}
+
+    def _load(self, model_size: str):
+        import whisper
+        return whisper.load_model(model_size)
+
+    def _decode_lock(self, model_size: str) -> threading.Lock:
+        with self._lock:
+            return self._decode_locks.setdefault(model_size, threading.Lock())
+
+    def transcribe(self, audio, model_size: str = "base", language: str | None = None,
+                   initial_prompt: str | None = None) -> tuple[str, str, list]:
+        model = self.load_model(model_size)
+        with self._decode_lock(model_size):
+            result = model.transcribe(audio, language=language, initial_prompt=initial_prompt)
+        segments = [{"start": segment["start"], "end": segment["end"], "text": segment["text"]}
+                    for segment in result["segments"]]
+        return result["text"], result["language"], segments
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """
+    faster-whisper (CTranslate2) with int8 weights on CPU.
+
+    Uses a fraction of the memory of the PyTorch model and runs several
+    times faster on CPU. FASTER_WHISPER_COMPUTE_TYPE overrides the
+    quantisation (e.g. int8_float32, float32) and FASTER_WHISPER_THREADS the
+    number of threads per model (default: CTranslate2's choice).
+    """
+
+    name = "faster-whisper"
+
+    def _load(self, model_size: str):
+        from faster_whisper import WhisperModel
+        return WhisperModel(
+            model_size,
+            device="cpu",
+            compute_type=os.getenv("FASTER_WHISPER_COMPUTE_TYPE", "int8"),
+            cpu_threads=int(os.getenv("FASTER_WHISPER_THREADS", "0")),
+        )
+
+    def transcribe(self, audio, model_size: str = "base", language: str | None = None,
+                   initial_prompt: str | None = None) -> tuple[str, str, list]:
+        # Greedy decoding, like openai-whisper's default, rather than
+        # faster-whisper's default beam search of 5
+        segments, info = self.load_model(model_size).transcribe(
+            audio, language=language, initial_prompt=initial_prompt, beam_size=1
+        )
+        segments = [{"start": segment.start, "end": segment.end, "text": segment.text}
+                    for segment in segments]  # decoding happens while iterating
+        return "".join(segment["text"] for segment in segments), info.language, segments
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+def get_backend(name: str | None = None) -> TranscriptionBackend:
+    """
+    Return the process-wide instance of a transcription backend.
+
+    Args:
+        name (str | None): Key of BACKENDS (default: TRANSCRIPTION_BACKEND, whisper)
+    """
+    name = (name or os.getenv("TRANSCRIPTION_BACKEND", WhisperBackend.name)).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Invalid transcription backend '{name}', expected one of {', '.join(BACKENDS)}")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+def load_model(model_size: str = "base", backend: str | None = None):
+    """Load a model once per process and reuse it for later calls."""
+    return get_backend(backend).load_model(model_size)
+
+def transcribe_audio(audio_path: str, model_size: str = "base", backend: str | None = None) -> tuple[str, str, list]:
     """
     Transcribe audio file using Whisper.
-    
+
     Args:
         audio_path (str): Path to audio file
         model_size (str): Whisper model size (tiny, base, small, medium, large)
-        
+        backend (str | None): Transcription backend (default: TRANSCRIPTION_BACKEND)
+
     Returns:
-        tuple[str, str]: (transcript, detected_language)
+        tuple[str, str, list]: (transcript, detected_language, segments), where
+            segments are dicts with `start`, `end` (seconds) and `text`
     """
     try:
-        logger.info(f"Loading Whisper {model_size} model...")
-        model = whisper.load_model(model_size)
-        
-        logger.info("Loading audio file...")
-        # Load audio using soundfile
-        audio, sample_rate = sf.read(audio_path)
-        
-        # Convert to mono if stereo
-        if len(audio.shape) > 1:
-            audio = audio.mean(axis=1)
-            
-        # Resample to 16kHz if needed
-        if sample_rate != 16000:
-            audio = torch.from_numpy(audio).float()
-            audio = torch.nn.functional.interpolate(
-                audio.unsqueeze(0).unsqueeze(0),
-                size=int(len(audio) * 16000 / sample_rate),
-                mode='linear'
-            ).squeeze().numpy()
-        
-        logger.info("Transcribing audio...")
-        # Convert to float32
-        audio = audio.astype(np.float32)
-        
-        # Normalize audio
-        audio = audio / np.max(np.abs(audio))
-        
-        # Transcribe
-        result = model.transcribe(audio)
-        
-        transcript = result["text"]
-        detected_language = result["language"]
-        
+        engine = get_backend(backend)
+        audio = load_audio(audio_path)
+
+        logger.info(f"Transcribing audio with {engine.name}...")
+        transcript, detected_language, segments = engine.transcribe(audio, model_size)
+
         logger.info(f"Transcription completed. Detected language: {detected_language}")
-        return transcript, detected_language
-        
+        return transcript, detected_language, segments
+
     except Exception as e:
         logger.error(f"Transcription error: {str(e)}")
-        raise Exception(f"Failed to transcribe audio: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Failed to transcribe audio: {str(e)}")
+
+def split_windows(audio, window_seconds: float = WINDOW_SECONDS) -> list:
+    """
+    Split audio into consecutive windows of about `window_seconds`, cutting
+    at low-energy points.
+
+    Returns:
+        list: (start, end) sample indices covering the whole audio
+    """
+    import numpy as np
+
+    window = int(window_seconds * SAMPLE_RATE)
+    if window <= 0 or len(audio) <= window:
+        return [(0, len(audio))]
+
+    search = int(CUT_SEARCH_SECONDS * SAMPLE_RATE)
+    frame = int(CUT_FRAME_SECONDS * SAMPLE_RATE)
+    windows = []
+    start = 0
+    # A short tail is folded into the last window rather than left on its own
+    while len(audio) - start > window + window // 4:
+        search_start = start + window - search
+        frames = audio[search_start:start + window]
+        frames = frames[:len(frames) // frame * frame].reshape(-1, frame)
+        quietest = int(np.argmin((frames ** 2).mean(axis=1)))
+        cut = search_start + quietest * frame + frame // 2
+        windows.append((start, cut))
+        start = cut
+    windows.append((start, len(audio)))
+    return windows
+
+def transcribe_windows(audio_path: str, model_size: str = "base", backend: str | None = None,
+                       completed: list | None = None, cancel: CancelToken | None = None):
+    """
+    Transcribe an audio file window by window (see split_windows).
+
+    The language detected in the first window is used for the rest, and the
+    end of each window's text is the prompt for the next.
+
+    Args:
+        audio_path (str): Path to audio file
+        model_size (str): Whisper model size
+        backend (str | None): Transcription backend (default: TRANSCRIPTION_BACKEND)
+        completed (list | None): Windows yielded by an earlier run, e.g. from a
+            checkpoint; they are yielded again without being transcribed
+        cancel (CancelToken | None): Checked before each window is transcribed
+
+    Yields:
+        dict: `number`, `samples` ([start, end] sample indices), `language`,
+            `text` and `segments`, with segment times relative to the start
+            of the file
+    """
+    engine = get_backend(backend)
+    audio = load_audio(audio_path)
+    windows = split_windows(audio)
+    completed = completed or []
+    cancel = cancel or CancelToken()
+    language = None
+    prompt = None
+
+    for number, (start, end) in enumerate(windows):
+        if number < len(completed) and completed[number]["samples"] == [start, end]:
+            window = completed[number]
+        else:
+            completed = []  # windows no longer line up: transcribe the rest
+            cancel.raise_if_cancelled()
+            logger.info(f"Transcribing window {number + 1}/{len(windows)} with {engine.name}...")
+            text, detected_language, segments = engine.transcribe(audio[start:end], model_size, language, prompt)
+            offset = start / SAMPLE_RATE
+            window = {
+                "number": number,
+                "samples": [start, end],
+                "language": language or detected_language,
+                "text": text.strip(),
+                "segments": [{"start": segment["start"] + offset, "end": segment["end"] + offset,
+                              "text": segment["text"]} for segment in segments],
+            }
+        language = window["language"]
+        prompt = window["text"][-PROMPT_CHARS:] or prompt
+        yield window
+
+async def stream_transcription(audio_path: str, model_size: str = "base", backend: str | None = None,
+                               completed: list | None = None, on_window=None,
+                               cancel: CancelToken | None = None):
+    """
+    Async stream of transcribe_windows: windows are transcribed on a worker
+    thread and each one is yielded as soon as it is ready. `on_window` is
+    called with each window on that thread, e.g. to checkpoint it before
+    the consumer gets to it. `cancel` stops the thread before the next
+    window, and Cancelled is raised to the consumer. If the consumer stops
+    early (it failed, or closed the stream), the thread stops too before
+    the next window.
+
+    Yields:
+        dict: A window (see transcribe_windows)
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in transcribe_windows(audio_path, model_size, backend, completed, cancel):
+                if on_window:
+                    on_window(item)
+                if stop.is_set():
+                    logger.info("Transcription stream closed, stopping before the next window")
+                    return
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+        except Cancelled as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        except Exception as e:
+            logger.error(f"Transcription error: {str(e)}")
+            loop.call_soon_threadsafe(queue.put_nowait, Exception(f"Failed to transcribe audio: {str(e)}"))
+
+    loop.run_in_executor(None, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
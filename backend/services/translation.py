@@ -1,6 +1,7 @@
+import asyncio
 import logging
-from deep_translator import GoogleTranslator
 import re
+from .cancellation import CancelToken, Cancelled
 
 logger = logging.getLogger(__name__)
 
@@ -44,13 +45,28 @@ def restore_code_blocks(text: str, code_blocks: list) -> str:
         text = text.replace(f"CODE_BLOCK_{i}", code)
     return text
 
-async def translate_text(text: str, target_language: str) -> str:
+def translate_chunk(chunk: str, target_language: str) -> str:
+    """Translate one chunk of at most split_text's max_length characters."""
+    try:
+        from deep_translator import GoogleTranslator
+
+        translator = GoogleTranslator(source='auto', target=target_language)
+        return translator.translate(chunk)
+    except Exception as e:
+        logger.error(f"Error translating chunk: {str(e)}")
+        raise Exception(f"Translation failed: {str(e)}")
+
+async def translate_text(text: str, target_language: str, checkpoint=None,
+                         cancel: CancelToken | None = None) -> str:
     """
     Translate text to target language using Google Translate.
     
     Args:
         text (str): Text to translate
         target_language (str): Target language code (e.g., 'es', 'fr', 'de')
+        checkpoint (Checkpoint | None): Where finished chunks are recorded, so
+            a retried job does not translate them again
+        cancel (CancelToken | None): Checked before each chunk is translated
         
     Returns:
         str: Translated text
@@ -69,16 +85,17 @@ async def translate_text(text: str, target_language: str) -> str:
         # Split text into chunks if needed
         chunks = split_text(text_without_code)
         translated_chunks = []
+        cancel = cancel or CancelToken()
         
         # Translate each chunk
-        for chunk in chunks:
-            try:
-                translator = GoogleTranslator(source='auto', target=target_language)
-                translated_chunk = translator.translate(chunk)
-                translated_chunks.append(translated_chunk)
-            except Exception as e:
-                logger.error(f"Error translating chunk: {str(e)}")
-                raise Exception(f"Translation failed: {str(e)}")
+        for number, chunk in enumerate(chunks):
+            translated_chunk = checkpoint.get("translation", number, chunk) if checkpoint else None
+            if translated_chunk is None:
+                cancel.raise_if_cancelled()
+                translated_chunk = translate_chunk(chunk, target_language)
+                if checkpoint:
+                    checkpoint.put("translation", number, chunk, translated_chunk)
+            translated_chunks.append(translated_chunk)
         
         # Combine translated chunks
         translated_text = " ".join(translated_chunks)
@@ -89,6 +106,68 @@ async def translate_text(text: str, target_language: str) -> str:
         logger.info("Translation completed successfully")
         return final_text
         
+    except Cancelled:
+        raise
     except Exception as e:
         logger.error(f"Translation error: {str(e)}")
-        raise Exception(f"Translation failed: {str(e)}") 
\ No newline at end of file
+        raise Exception(f"Translation failed: {str(e)}")
+
+# Text is sent for translation once at least this many characters of
+# complete sentences have arrived, to keep the number of requests down
+STREAM_MIN_CHARS = 1000
+
+async def translate_stream(texts, target_language: str, min_chars: int = STREAM_MIN_CHARS, checkpoint=None,
+                           cancel: CancelToken | None = None):
+    """
+    Translate text as it arrives, e.g. window by window from the transcriber.
+
+    Incoming text is buffered until it holds at least `min_chars` characters
+    of complete sentences; those are split with split_text and translated on
+    a worker thread while the rest stays buffered. Whatever remains is
+    translated when the input ends.
+
+    Args:
+        texts: Async iterator of text pieces
+        target_language (str): Target language code
+        checkpoint (Checkpoint | None): Where finished chunks are recorded, so
+            a retried job does not translate them again
+        cancel (CancelToken | None): Checked before each chunk is translated
+
+    Yields:
+        str: Translated text, in order
+    """
+    cancel = cancel or CancelToken()
+
+    async def translate(number: int, text: str) -> str:
+        translated = checkpoint.get("translation", number, text) if checkpoint else None
+        if translated is None:
+            text_without_code, code_blocks = preserve_code_blocks(text)
+            translated_chunks = []
+            for chunk in split_text(text_without_code):
+                cancel.raise_if_cancelled()
+                translated_chunks.append(await asyncio.to_thread(translate_chunk, chunk, target_language))
+            translated = restore_code_blocks(" ".join(translated_chunks), code_blocks)
+            if checkpoint:
+                checkpoint.put("translation", number, text, translated)
+        return translated
+
+    # Skip translation if target language is English, as translate_text does
+    if target_language.lower() == 'en':
+        async for text in texts:
+            yield text
+        return
+
+    buffer = ""
+    number = 0
+    async for text in texts:
+        buffer = f"{buffer} {text}".strip()
+        # Everything up to the last sentence end is complete
+        boundary = max(buffer.rfind(end) for end in (". ", "! ", "? "))
+        if boundary >= 0 and boundary + 1 >= min_chars:
+            complete, buffer = buffer[:boundary + 1], buffer[boundary + 2:]
+            logger.info(f"Translating {len(complete)} characters to {target_language}")
+            yield await translate(number, complete)
+            number += 1
+
+    if buffer:
+        yield await translate(number, buffer)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from .jobs import FAILED, JobQueue, get_queue
+from .pipeline import run_pipeline, schedule_abandoned_cleanup
+from .cancellation import CancelToken, Cancelled
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> coroutine function called with the job payload as keyword
+# arguments, plus `cancel`, the job's CancelToken
+HANDLERS = {
+    "process_video": run_pipeline,
+}
+
+# Job kind -> function called with the job payload when a job of that kind
+# ends cancelled or failed, to dispose of what it left behind
+ABANDON_HANDLERS = {
+    "process_video": schedule_abandoned_cleanup,
+}
+
+# How often a running job checks whether it has been cancelled (see JobQueue.release)
+CANCEL_POLL_SECONDS = 2.0
+
+class Worker:
+    """Consume jobs from the queue, keeping each lease alive while the job runs."""
+
+    def __init__(self, queue: JobQueue | None = None, worker_id: str | None = None,
+                 lease_seconds: float = 60.0, poll_interval: float = 1.0):
+        self.queue = queue or get_queue()
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _heartbeat(self, job_id: str, done: threading.Event, cancel: CancelToken):
+        """
+        Renew the lease every third of its length until the job finishes, and
+        cancel the job's token once nobody is waiting for it any more.
+        """
+        renew_at = time.monotonic() + self.lease_seconds / 3
+        while not done.wait(min(CANCEL_POLL_SECONDS, self.lease_seconds / 3)):
+            if not cancel.cancelled and self.queue.cancel_requested(job_id):
+                logger.info(f"Cancelling job {job_id}: nobody is waiting for it")
+                cancel.cancel()
+            if time.monotonic() >= renew_at:
+                if not self.queue.heartbeat(job_id, self.worker_id, self.lease_seconds):
+                    logger.warning(f"Worker {self.worker_id} lost the lease on job {job_id}")
+                    return
+                renew_at = time.monotonic() + self.lease_seconds / 3
+
+    def run_once(self) -> bool:
+        """Run one job if one is available. Returns False when the queue was empty."""
+        job = self.queue.lease(self.worker_id, self.lease_seconds)
+        if job is None:
+            return False
+
+        logger.info(f"Worker {self.worker_id} running job {job['id']} (attempt {job['attempts']})")
+        done = threading.Event()
+        cancel = CancelToken()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job["id"], done, cancel), daemon=True)
+        heartbeat.start()
+        try:
+            handler = HANDLERS.get(job["kind"])
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            result = asyncio.run(handler(**job["payload"], cancel=cancel))
+            self.queue.complete(job["id"], self.worker_id, result)
+            logger.info(f"Job {job['id']} completed")
+        except Cancelled:
+            if self.queue.cancel(job["id"], self.worker_id):
+                logger.info(f"Job {job['id']} cancelled")
+                self._abandon(job)
+            else:
+                # A new request joined while the job was stopping: run it again,
+                # resuming from its checkpoint
+                logger.info(f"Job {job['id']} was requested again while being cancelled, re-queueing")
+                self.queue.requeue(job["id"], self.worker_id)
+        except ValueError as e:
+            # Bad input (invalid URL, unknown kind): retrying will not help
+            logger.error(f"Job {job['id']} failed permanently: {str(e)}")
+            if self.queue.fail(job["id"], self.worker_id, str(e), retry=False):
+                self._abandon(job)
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {str(e)}")
+            if self.queue.fail(job["id"], self.worker_id, str(e)) and self.queue.get(job["id"])["status"] == FAILED:
+                self._abandon(job)
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def _abandon(self, job: dict):
+        handler = ABANDON_HANDLERS.get(job["kind"])
+        if handler is None:
+            return
+        try:
+            handler(**job["payload"])
+        except Exception as e:
+            logger.warning(f"Cleanup after job {job['id']} failed: {str(e)}")
+
+    def run_forever(self):
+        """Process jobs until `stop()` is called, finishing the current job first."""
+        logger.info(f"Worker {self.worker_id} started")
+        while not self.stop_event.is_set():
+            try:
+                if not self.run_once():
+                    self.queue.wait(self.poll_interval)
+            except Exception as e:
+                logger.error(f"Worker {self.worker_id} error: {str(e)}")
+                self.stop_event.wait(self.poll_interval)
+        logger.info(f"Worker {self.worker_id} stopped")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def start(self):
+        """Run the worker on a daemon thread."""
+        self.thread = threading.Thread(target=self.run_forever, name=f"worker-{self.worker_id}", daemon=True)
+        self.thread.start()
+        return self
@@ -1,12 +1,15 @@
-import yt_dlp
 import os
+import threading
 import logging
 import asyncio
+import json
 import re
 from urllib.parse import urlparse, parse_qs
 import shutil
 import time
 from .file_manager import file_manager
+from .captions import trim_tracks
+from .cancellation import CancelToken, Cancelled
 
 logger = logging.getLogger(__name__)
 
@@ -39,9 +42,59 @@ def extract_video_id(url: str) -> str:
             
     raise ValueError("Invalid YouTube URL")
 
+# Metadata fields kept from the yt-dlp info dict
+PROBE_KEYS = ('id', 'title', 'duration', 'language')
+# Caption tracks kept from the info dict, reduced to their WebVTT URLs
+CAPTION_KEYS = ('subtitles', 'automatic_captions')
+
+def probe_video(url: str, video_id: str) -> dict:
+    """
+    Fetch video metadata without downloading anything.
+
+    The result is cached in the output directory, so API and worker
+    processes probe each video at most once.
+
+    Args:
+        url (str): YouTube video URL
+        video_id (str): ID of the video
+
+    Returns:
+        dict: Subset of the yt-dlp info dict (see PROBE_KEYS and CAPTION_KEYS)
+    """
+    info_path = file_manager.get_file_path(video_id, "info")
+    if os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    import yt_dlp
+
+    logger.info(f"Probing video {video_id}")
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'skip_download': True,
+        'noplaylist': True,
+        'socket_timeout': 30,
+    }
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    probed = {key: info.get(key) for key in PROBE_KEYS}
+    for key in CAPTION_KEYS:
+        probed[key] = trim_tracks(info.get(key))
+    info = probed
+
+    # Write atomically: other processes may be reading the cache
+    tmp_path = f"{info_path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    os.replace(tmp_path, info_path)
+    return info
+
 def download_audio(url: str, video_id: str) -> str:
     """Download audio from YouTube video in MP3 format"""
     try:
+        import yt_dlp
+
         # Check if audio file already exists
         output_path = file_manager.get_file_path(video_id, "audio")
         if file_manager.file_exists(video_id, "audio"):
@@ -86,13 +139,19 @@ def download_audio(url: str, video_id: str) -> str:
         logger.error(f"Error downloading audio: {str(e)}")
         raise Exception(f"Failed to download audio: {str(e)}")
 
-async def download_audio(url: str, video_id: str) -> str:
-    """Download audio from YouTube video."""
+async def download_audio(url: str, video_id: str, cancel: CancelToken | None = None) -> str:
+    """Download audio from YouTube video, stopping at the next progress update once `cancel` is set."""
     try:
+        import yt_dlp
+
         logger.info(f"Starting audio download for URL: {url}")
         
         # Get output path
         output_path = file_manager.get_file_path(video_id, "audio")
+        cancel = cancel or CancelToken()
+
+        def check_cancelled(progress: dict):
+            cancel.raise_if_cancelled()
         
         # Configure yt-dlp options with more robust settings
         ydl_opts = {
@@ -125,6 +184,8 @@ async def download_audio(url: str, video_id: str) -> str:
             'retries': 10,
             'fragment_retries': 10,
             'skip_download_archive': True,
+            'progress_hooks': [check_cancelled],
+            'postprocessor_hooks': [check_cancelled],
             'extractor_args': {
                 'youtube': {
                     'skip': ['dash', 'hls'],
@@ -148,6 +209,8 @@ async def download_audio(url: str, video_id: str) -> str:
                 ydl_opts['format'] = format
                 with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                     ydl.download([url])
+                # With ignoreerrors, yt-dlp reports the hook's exception instead of raising it
+                cancel.raise_if_cancelled()
                     
                 # Check for the final file
                 if os.path.exists(output_path):
@@ -161,6 +224,8 @@ async def download_audio(url: str, video_id: str) -> str:
                     logger.info(f"Successfully downloaded audio to: {output_path}")
                     return output_path
                     
+            except Cancelled:
+                raise
             except Exception as e:
                 last_error = e
                 logger.warning(f"Failed to download with format {format}: {str(e)}")
@@ -171,6 +236,9 @@ async def download_audio(url: str, video_id: str) -> str:
             
         raise Exception("Failed to download audio after trying all formats")
         
+    except Cancelled:
+        logger.info(f"Download of video {video_id} cancelled")
+        raise
     except Exception as e:
         logger.error(f"Error downloading audio: {str(e)}")
         if "403" in str(e):
@@ -0,0 +1,118 @@
+"""Caption fast path: track selection, WebVTT parsing and the fallback to transcription."""
+import sys
+import types
+
+import pytest
+
+from services.captions import fetch_captions, parse_vtt, select_caption_track
+
+def track(url: str) -> list:
+    return [{"ext": "vtt", "url": url}]
+
+INFO = {
+    "language": "de",
+    "subtitles": {"de": track("manual-de"), "en-GB": track("manual-en-gb")},
+    "automatic_captions": {"en": track("auto-en"), "de": track("auto-de"), "fr": track("auto-fr")},
+}
+
+def test_manual_track_in_the_target_language_wins():
+    assert select_caption_track(INFO, "en", "manual") == {
+        "kind": "manual", "language": "en", "ext": "vtt", "url": "manual-en-gb",
+    }
+    # Manual subtitles are preferred even under the auto policy
+    assert select_caption_track(INFO, "en", "auto")["url"] == "manual-en-gb"
+
+def test_falls_back_to_the_source_language():
+    assert select_caption_track(INFO, "es", "manual")["url"] == "manual-de"
+
+def test_automatic_captions_need_the_auto_policy():
+    info = {"language": "fr", "automatic_captions": INFO["automatic_captions"]}
+
+    assert select_caption_track(info, "en", "manual") is None
+    assert select_caption_track(info, "en", "auto")["url"] == "auto-en"
+    assert select_caption_track(info, "es", "auto") == {
+        "kind": "auto", "language": "fr", "ext": "vtt", "url": "auto-fr",
+    }
+
+def test_regional_variant_matches_the_base_language():
+    info = {"subtitles": {"pt-BR": track("pt-br")}}
+
+    assert select_caption_track(info, "pt", "manual")["language"] == "pt"
+    assert select_caption_track({"subtitles": {"pt": track("pt")}}, "pt-BR", "manual")["url"] == "pt"
+
+def test_no_track_when_policy_is_off_or_nothing_matches():
+    assert select_caption_track(INFO, "en", "off") is None
+    assert select_caption_track({"language": "ja"}, "en", "auto") is None
+
+ROLLING_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.500 align:start position:0%
+hello<00:00:00.500><c> there</c>
+
+00:00:02.500 --> 00:00:04.000
+hello there
+general &amp; kenobi
+
+00:00:04.000 --> 00:00:06.000
+general &amp; kenobi
+"""
+
+def test_parse_vtt_drops_rolling_repeats():
+    assert parse_vtt(ROLLING_VTT) == [
+        {"start": 0.0, "end": 2.5, "text": "hello there"},
+        {"start": 2.5, "end": 4.0, "text": "general & kenobi"},
+    ]
+
+def test_parse_vtt_reads_timestamps_with_and_without_hours():
+    text = "WEBVTT\r\n\r\nNOTE a comment\r\n\r\n1\r\n01:02.250 --> 01:04.000\r\nfirst\r\n\r\n" \
+           "1:00:00.000 --> 1:00:01.500\r\nsecond\r\n"
+    assert parse_vtt(text) == [
+        {"start": 62.25, "end": 64.0, "text": "first"},
+        {"start": 3600.0, "end": 3601.5, "text": "second"},
+    ]
+
+class Response:
+    def __init__(self, text: str, status: int = 200):
+        self.text = text
+        self.status = status
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise Exception(f"HTTP {self.status}")
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """Serve caption URLs from a dict through a stand-in for the requests module."""
+    responses = {}
+
+    def get(url, timeout):
+        response = responses[url]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setitem(sys.modules, "requests", types.SimpleNamespace(get=get))
+    return responses
+
+def test_fetch_captions_builds_the_transcript(fetched):
+    fetched["manual-en-gb"] = Response(ROLLING_VTT)
+
+    transcript, language, segments, provenance = fetch_captions(INFO, "en", "manual")
+    assert transcript == "hello there general & kenobi"
+    assert language == "en" and len(segments) == 2
+    assert provenance == {"kind": "manual", "language": "en", "format": "vtt"}
+
+@pytest.mark.parametrize("response", [
+    Response("", status=404),
+    ConnectionError("network down"),
+    Response("WEBVTT\n\n00:00.000 --> 00:01.000\n\n"),
+], ids=["http-error", "network-error", "empty-track"])
+def test_fetch_captions_falls_back_to_transcription(fetched, response):
+    fetched["manual-en-gb"] = response
+    assert fetch_captions(INFO, "en", "manual") is None
+
+def test_fetch_captions_without_a_track_does_not_fetch(fetched):
+    assert fetch_captions(INFO, "en", "off") is None
+    assert fetch_captions({}, "en", "auto") is None
@@ -0,0 +1,82 @@
+"""Checkpoint files: resuming, torn lines, stale parameters and source checks."""
+import json
+
+import pytest
+
+from services.checkpoints import Checkpoint
+from services.file_manager import file_manager
+
+PARAMS = {"model_size": "base", "target_language": "en", "backend": "whisper"}
+
+@pytest.fixture(autouse=True)
+def outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_manager, "base_dir", str(tmp_path))
+    return tmp_path
+
+def window(number: int) -> dict:
+    return {"number": number, "start": number * 30.0, "segments": [{"text": f"window {number}"}]}
+
+def lines(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_resumes_recorded_work():
+    checkpoint = Checkpoint("video", PARAMS)
+    checkpoint.add_window(window(0))
+    checkpoint.add_window(window(2))
+    checkpoint.put("translation", 0, "Hallo", "Hello")
+
+    resumed = Checkpoint("video", PARAMS)
+    # Windows stop at the first gap
+    assert [w["number"] for w in resumed.windows()] == [0]
+    assert resumed.get("translation", 0, "Hallo") == "Hello"
+    assert resumed.get("draft", 0, "Hallo") is None
+
+def test_torn_last_line_is_dropped():
+    checkpoint = Checkpoint("video", PARAMS)
+    checkpoint.add_window(window(0))
+    checkpoint.add_window(window(1))
+    with open(checkpoint.path, "a", encoding="utf-8") as f:
+        f.write('{"type": "window", "number": 2, "sta')
+
+    resumed = Checkpoint("video", PARAMS)
+    assert [w["number"] for w in resumed.windows()] == [0, 1]
+    # The file is rewritten, so new records do not land after the torn line
+    resumed.add_window(window(2))
+    assert [record.get("number") for record in lines(resumed.path)] == [None, 0, 1, 2]
+
+def test_header_mismatch_starts_fresh():
+    checkpoint = Checkpoint("video", PARAMS)
+    checkpoint.add_window(window(0))
+    # A file left by another version whose header no longer matches
+    with open(checkpoint.path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "params", **PARAMS, "model_size": "large"}) + "\n")
+        f.write(json.dumps({"type": "window", **window(0)}) + "\n")
+
+    fresh = Checkpoint("video", PARAMS)
+    assert fresh.windows() == []
+    assert lines(fresh.path) == [{"type": "params", **PARAMS}]
+
+def test_each_set_of_parameters_has_its_own_file():
+    english = Checkpoint("video", PARAMS)
+    german = Checkpoint("video", dict(PARAMS, target_language="de"))
+    english.put("translation", 0, "source", "english")
+
+    assert english.path != german.path
+    assert Checkpoint("video", dict(PARAMS, target_language="de")).get("translation", 0, "source") is None
+    assert Checkpoint("video", PARAMS).get("translation", 0, "source") == "english"
+
+def test_get_checks_the_source_text():
+    checkpoint = Checkpoint("video", PARAMS)
+    checkpoint.put("draft", 3, "section text", "draft notes")
+
+    assert checkpoint.get("draft", 3, "section text") == "draft notes"
+    # Source changed since the draft was made, e.g. a different transcript
+    assert checkpoint.get("draft", 3, "edited section text") is None
+    assert Checkpoint("video", PARAMS).get("draft", 3, "edited section text") is None
+
+def test_clear_removes_the_file(outputs):
+    checkpoint = Checkpoint("video", PARAMS)
+    checkpoint.clear()
+    assert list(outputs.iterdir()) == []
+    checkpoint.clear()
@@ -0,0 +1,105 @@
+"""Compressed text artifacts: codec choice, legacy files, sizes and content negotiation."""
+import gzip
+import os
+
+import pytest
+
+from main import accepts_encoding
+from services.file_manager import FileManager, compress, original_size
+
+TEXT = "Grüße aus dem Transkript. " * 200
+
+@pytest.fixture
+def make_manager(tmp_path, monkeypatch):
+    """Build a FileManager over tmp_path, compressing with the given ARTIFACT_COMPRESSION."""
+    def make(codec: str) -> FileManager:
+        monkeypatch.setenv("OUTPUTS_DIR", str(tmp_path))
+        monkeypatch.setenv("ARTIFACT_COMPRESSION", codec)
+        manager = FileManager()
+        manager.start(with_scheduler=False)
+        return manager
+    return make
+
+def test_gzip_round_trip(make_manager, tmp_path):
+    manager = make_manager("gzip")
+    path = manager.write_text("video", "transcript", TEXT)
+
+    assert path == str(tmp_path / "video_transcript.txt.gz")
+    assert manager.get_file_path("video", "transcript") == path
+    assert manager.read_bytes(path).decode("utf-8") == TEXT
+    assert os.path.getsize(path) < len(TEXT.encode("utf-8"))
+
+def test_no_compression(make_manager, tmp_path):
+    manager = make_manager("none")
+    path = manager.write_text("video", "notes", TEXT)
+
+    assert path == str(tmp_path / "video_notes.md")
+    assert (tmp_path / "video_notes.md").read_text(encoding="utf-8") == TEXT
+    assert original_size(path) == os.path.getsize(path)
+
+def test_other_types_are_never_compressed(make_manager, tmp_path):
+    manager = make_manager("gzip")
+    assert manager.write_text("video", "meta", "{}") == str(tmp_path / "video_meta.json")
+
+def test_legacy_plain_file_is_still_found(make_manager, tmp_path):
+    # Written before compression was enabled
+    (tmp_path / "video_transcript.txt").write_text(TEXT, encoding="utf-8")
+    manager = make_manager("gzip")
+
+    path = manager.get_file_path("video", "transcript")
+    assert path == str(tmp_path / "video_transcript.txt")
+    assert manager.file_exists("video", "transcript")
+    assert manager.read_bytes(path).decode("utf-8") == TEXT
+
+    # Rewriting it compresses it and removes the plain copy
+    manager.write_text("video", "transcript", TEXT)
+    assert sorted(os.listdir(tmp_path)) == ["video_transcript.txt.gz"]
+
+def test_write_removes_the_other_codecs_copy(make_manager, tmp_path):
+    pytest.importorskip("zstandard")
+    make_manager("zstd").write_text("video", "transcript", "old")
+    assert os.listdir(tmp_path) == ["video_transcript.txt.zst"]
+
+    manager = make_manager("gzip")
+    # The zstd copy is found until the artifact is rewritten
+    assert manager.get_file_path("video", "transcript").endswith(".zst")
+    manager.write_text("video", "transcript", TEXT)
+    assert os.listdir(tmp_path) == ["video_transcript.txt.gz"]
+
+def test_invalid_codec_is_rejected(make_manager):
+    with pytest.raises(ValueError, match="Invalid artifact compression"):
+        make_manager("brotli").codec
+
+def test_original_size_from_gzip_trailer(tmp_path):
+    data = TEXT.encode("utf-8")
+    path = tmp_path / "video_notes.md.gz"
+    path.write_bytes(compress(data, "gzip"))
+    assert original_size(str(path)) == len(data)
+
+    # ISIZE holds the size modulo 2**32: a 4 GiB + 5 byte file records 5
+    path.write_bytes(gzip.compress(b"", mtime=0)[:-4] + (5).to_bytes(4, "little"))
+    assert original_size(str(path)) == 5
+
+def test_original_size_from_zstd_frame_header(tmp_path):
+    pytest.importorskip("zstandard")
+    data = TEXT.encode("utf-8")
+    path = tmp_path / "video_notes.md.zst"
+    path.write_bytes(compress(data, "zstd"))
+    assert original_size(str(path)) == len(data)
+
+@pytest.mark.parametrize("header, encoding, accepted", [
+    ("gzip, deflate, br", "gzip", True),
+    ("GZIP", "gzip", True),
+    ("gzip;q=0.5, zstd", "zstd", True),
+    ("gzip;q=0, deflate", "gzip", False),
+    ("zstd; q=0.0", "zstd", False),
+    ("*", "zstd", True),
+    ("*;q=0", "gzip", False),
+    ("*;q=0, gzip", "gzip", True),
+    ("gzip;q=0, *", "gzip", False),
+    ("gzip;q=bogus", "gzip", False),
+    ("deflate, br", "gzip", False),
+    ("", "gzip", False),
+], ids=repr)
+def test_accepts_encoding(header, encoding, accepted):
+    assert accepts_encoding(header, encoding) is accepted
@@ -0,0 +1,356 @@
+"""
+State transitions of the job queues.
+
+Every test runs against SQLiteJobQueue and RedisJobQueue. The Redis queue
+uses the server at TEST_REDIS_URL (default redis://localhost:6379/15) when
+one is reachable, else fakeredis, which runs the Lua scripts through lupa.
+"""
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services import jobs
+from services.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, QueueLimitExceeded, retry_delay
+
+REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+class Clock:
+    """Stands in for the time module in services.jobs, so backoff and leases can be stepped through."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jobs, "time", clock)
+    return clock
+
+def redis_factory():
+    """Return a function building Redis clients: local server if reachable, else fakeredis."""
+    redis = pytest.importorskip("redis")
+    try:
+        redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5).ping()
+        return lambda url, **kwargs: redis.Redis.from_url(REDIS_URL, **kwargs)
+    except redis.ConnectionError:
+        fakeredis = pytest.importorskip("fakeredis")
+        pytest.importorskip("lupa")
+        server = fakeredis.FakeServer()
+        return lambda url, **kwargs: fakeredis.FakeRedis(server=server, **kwargs)
+
+@pytest.fixture(params=["sqlite", "redis"])
+def make_queue(request, tmp_path, monkeypatch, clock):
+    queues = []
+
+    def make_queue(policy: str = "fair") -> jobs.JobQueue:
+        if request.param == "sqlite":
+            queue = jobs.SQLiteJobQueue(str(tmp_path / f"jobs{len(queues)}.sqlite3"), policy)
+        else:
+            import redis
+            monkeypatch.setattr(redis.Redis, "from_url", redis_factory())
+            queue = jobs.RedisJobQueue("redis://test", policy, prefix=f"test:{uuid.uuid4().hex}:")
+        queues.append(queue)
+        return queue
+
+    yield make_queue
+    for queue in queues:
+        if isinstance(queue, jobs.RedisJobQueue):
+            for key in queue.redis.scan_iter(f"{queue.prefix}*"):
+                queue.redis.delete(key)
+
+@pytest.fixture
+def queue(make_queue):
+    return make_queue()
+
+def test_enqueue_shares_an_active_job(queue):
+    first = queue.enqueue("process_video", {"url": "a"}, "a", cost=10)
+    second = queue.enqueue("process_video", {"url": "a"}, "a", cost=10)
+
+    assert first["status"] == QUEUED and first["waiters"] == 1
+    assert second["id"] == "a" and second["waiters"] == 2
+    assert queue.counts() == {QUEUED: 1}
+    assert queue.pending() == (1, 10.0)
+
+def test_sjf_leases_the_cheapest_job_first(make_queue):
+    queue = make_queue("sjf")
+    queue.enqueue("k", {}, "long", cost=100)
+    queue.enqueue("k", {}, "short", cost=1)
+
+    assert queue.lease("w")["id"] == "short"
+    assert queue.lease("w")["id"] == "long"
+    assert queue.lease("w") is None
+
+def test_fair_policy_interleaves_clients(queue, clock):
+    for job_id in ("a1", "a2", "a3"):
+        queue.enqueue("k", {}, job_id, cost=10, client_id="a")
+        clock.advance(1)
+    queue.enqueue("k", {}, "b1", cost=10, client_id="b")
+
+    assert [queue.lease("w")["id"] for _ in range(4)] == ["a1", "b1", "a2", "a3"]
+
+def test_lease_heartbeat_and_complete(queue):
+    queue.enqueue("k", {"x": 1}, "a")
+    job = queue.lease("w1", lease_seconds=30)
+
+    assert job["status"] == RUNNING and job["lease_owner"] == "w1" and job["attempts"] == 1
+    assert job["payload"] == {"x": 1}
+    assert queue.heartbeat("a", "w1", 30)
+    assert not queue.heartbeat("a", "w2", 30)
+    assert not queue.complete("a", "w2", {"bad": True})
+    assert queue.complete("a", "w1", {"ok": True})
+
+    job = queue.get("a")
+    assert job["status"] == DONE and job["result"] == {"ok": True} and job["lease_owner"] is None
+    assert not queue.heartbeat("a", "w1", 30)
+
+def test_failed_job_is_retried_after_backoff(queue, clock):
+    queue.enqueue("k", {}, "a", max_attempts=2, cost=5)
+    queue.lease("w")
+    assert queue.fail("a", "w", "boom")
+
+    job = queue.get("a")
+    assert job["status"] == QUEUED and job["error"] == "boom"
+    assert queue.pending() == (1, 5.0)
+    assert queue.lease("w") is None  # still backing off
+
+    clock.advance(retry_delay(1))
+    job = queue.lease("w")
+    assert job["id"] == "a" and job["attempts"] == 2
+
+    assert queue.fail("a", "w", "boom again")
+    assert queue.get("a")["status"] == FAILED
+    assert queue.lease("w") is None
+
+def test_fail_without_retry(queue):
+    queue.enqueue("k", {}, "a")
+    queue.lease("w")
+    assert queue.fail("a", "w", "bad input", retry=False)
+    assert queue.get("a")["status"] == FAILED
+
+def test_expired_lease_is_taken_over(queue, clock):
+    queue.enqueue("k", {}, "a")
+    queue.lease("w1", lease_seconds=10)
+    clock.advance(11)
+
+    job = queue.lease("w2", lease_seconds=10)
+    assert job["id"] == "a" and job["lease_owner"] == "w2" and job["attempts"] == 2
+    assert not queue.heartbeat("a", "w1", 10)
+    assert not queue.complete("a", "w1", {})
+
+def test_expired_lease_without_attempts_left_fails(queue, clock):
+    queue.enqueue("k", {}, "a", max_attempts=1)
+    queue.lease("w1", lease_seconds=10)
+    clock.advance(11)
+
+    assert queue.lease("w2") is None
+    job = queue.get("a")
+    assert job["status"] == FAILED and job["error"] == "Lease expired"
+
+def test_finished_job_is_replaced_when_enqueued_again(queue):
+    queue.enqueue("k", {}, "a")
+    queue.lease("w")
+    queue.complete("a", "w", {"ok": True})
+
+    job = queue.enqueue("k", {}, "a")
+    assert job["status"] == QUEUED and job["attempts"] == 0 and job["result"] is None
+
+def test_releasing_the_last_waiter_cancels_a_queued_job(queue):
+    first = queue.enqueue("k", {}, "a", cost=3)["waiter"]
+    second = queue.enqueue("k", {}, "a", cost=3)["waiter"]
+    assert first != second
+
+    assert queue.release("a", first)["status"] == QUEUED
+    job = queue.release("a", second)
+    assert job["status"] == CANCELLED and job["waiters"] == 0
+    assert queue.pending() == (0, 0.0)
+    assert queue.lease("w") is None
+    assert queue.release("missing", first) is None
+
+def test_a_waiter_is_released_only_once(queue):
+    first = queue.enqueue("k", {}, "a")["waiter"]
+    queue.enqueue("k", {}, "a")
+
+    assert queue.release("a", first)["waiters"] == 1
+    assert queue.release("a", first)["waiters"] == 1
+    job = queue.release("a", "unknown")
+    assert job["status"] == QUEUED and job["waiters"] == 1
+
+def test_waiters_of_a_finished_job_do_not_carry_over(queue):
+    old = queue.enqueue("k", {}, "a")["waiter"]
+    queue.lease("w")
+    queue.complete("a", "w", {})
+
+    queue.enqueue("k", {}, "a")
+    assert queue.release("a", old)["status"] == QUEUED
+
+def test_releasing_a_backing_off_job_cancels_it(queue, clock):
+    waiter = queue.enqueue("k", {}, "a")["waiter"]
+    queue.lease("w")
+    queue.fail("a", "w", "boom")
+
+    assert queue.release("a", waiter)["status"] == CANCELLED
+    clock.advance(retry_delay(1))
+    assert queue.lease("w") is None
+
+def test_releasing_the_last_waiter_asks_the_worker_to_stop(queue):
+    waiter = queue.enqueue("k", {}, "a")["waiter"]
+    queue.lease("w")
+
+    job = queue.release("a", waiter)
+    assert job["status"] == RUNNING and job["cancel_requested"]
+    assert queue.cancel_requested("a")
+    assert not queue.cancel("a", "other")
+    assert queue.cancel("a", "w")
+    assert queue.get("a")["status"] == CANCELLED
+
+def test_rejoining_withdraws_the_cancellation(queue):
+    waiter = queue.enqueue("k", {}, "a")["waiter"]
+    queue.lease("w")
+    queue.release("a", waiter)
+
+    job = queue.enqueue("k", {}, "a")
+    assert job["waiters"] == 1 and not job["cancel_requested"]
+    assert not queue.cancel_requested("a")
+    assert not queue.cancel("a", "w")
+    assert queue.get("a")["status"] == RUNNING
+
+def test_expired_lease_of_a_cancelled_job_is_not_retried(queue, clock):
+    waiter = queue.enqueue("k", {}, "a")["waiter"]
+    queue.lease("w1", lease_seconds=10)
+    queue.release("a", waiter)
+    clock.advance(11)
+
+    assert queue.lease("w2") is None
+    assert queue.get("a")["status"] == CANCELLED
+
+def test_enqueue_limits_new_jobs_but_not_joins(queue):
+    queue.enqueue("k", {}, "a", cost=10, max_jobs=2)
+    queue.enqueue("k", {}, "b", cost=10, max_jobs=2)
+
+    with pytest.raises(QueueLimitExceeded) as exc:
+        queue.enqueue("k", {}, "c", cost=10, max_jobs=2)
+    assert (exc.value.count, exc.value.pending_cost) == (2, 20.0)
+    assert queue.get("c") is None
+
+    assert queue.enqueue("k", {}, "a", cost=10, max_jobs=2)["waiters"] == 2
+
+def test_enqueue_limits_queued_cost(queue, clock):
+    waiter = queue.enqueue("k", {}, "big", cost=500, max_cost=100)["waiter"]  # alone, so let through
+    with pytest.raises(QueueLimitExceeded):
+        queue.enqueue("k", {}, "small", cost=1, max_cost=100)
+
+    queue.lease("w")
+    queue.fail("big", "w", "boom")  # backing off still counts as queued
+    with pytest.raises(QueueLimitExceeded):
+        queue.enqueue("k", {}, "small", cost=1, max_cost=100)
+
+    queue.release("big", waiter)
+    assert queue.enqueue("k", {}, "small", cost=1, max_cost=100)["status"] == QUEUED
+
+def test_concurrent_admissions_respect_the_limit(tmp_path):
+    queue = jobs.SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"))
+    barrier = threading.Barrier(8)
+
+    def admit(i):
+        barrier.wait()
+        try:
+            queue.enqueue("k", {}, f"job{i}", cost=1, max_jobs=3)
+            return True
+        except QueueLimitExceeded:
+            return False
+
+    with ThreadPoolExecutor(8) as pool:
+        admitted = list(pool.map(admit, range(8)))
+    assert admitted.count(True) == 3
+    assert queue.pending() == (3, 3.0)
+
+def test_requeue_runs_the_job_again_without_using_an_attempt(queue):
+    waiter = queue.enqueue("k", {}, "a", max_attempts=1)["waiter"]
+    queue.lease("w")
+    queue.release("a", waiter)
+    queue.enqueue("k", {}, "a")  # rejoined while the worker was stopping
+
+    assert not queue.cancel("a", "w")
+    assert not queue.requeue("a", "other")
+    assert queue.requeue("a", "w")
+    job = queue.get("a")
+    assert job["status"] == QUEUED and job["attempts"] == 0 and not job["cancel_requested"]
+
+    job = queue.lease("w")  # runnable straight away, with its last attempt left
+    assert job["id"] == "a" and job["attempts"] == 1
+
+def test_jobs_of_a_group_run_one_at_a_time(queue, clock):
+    queue.enqueue("k", {}, "v:en", cost=1, group_id="v")
+    queue.enqueue("k", {}, "v:fr", cost=1, group_id="v")
+    queue.enqueue("k", {}, "other", cost=1, group_id="w")
+
+    assert queue.lease("w1", lease_seconds=10)["id"] == "v:en"
+    assert queue.lease("w2")["id"] == "other"
+    assert queue.lease("w2") is None  # v:fr waits for v:en
+
+    queue.complete("v:en", "w1", {})
+    assert queue.lease("w2", lease_seconds=10)["id"] == "v:fr"
+
+def test_a_group_is_freed_when_its_job_stops_running(queue, clock):
+    queue.enqueue("k", {}, "v:en", cost=1, group_id="v")
+    queue.enqueue("k", {}, "v:fr", cost=1, group_id="v")
+    queue.lease("w1", lease_seconds=10)
+
+    queue.requeue("v:en", "w1")
+    assert queue.lease("w1", lease_seconds=10)["id"] == "v:en"
+    queue.fail("v:en", "w1", "boom")
+    assert queue.lease("w2", lease_seconds=10)["id"] == "v:fr"
+
+    clock.advance(11)  # v:fr's worker died; v:en is due for its retry
+    job = queue.lease("w3", lease_seconds=10)
+    assert job["id"] in ("v:en", "v:fr")
+    assert queue.lease("w4") is None
+
+def test_prune_deletes_finished_jobs_after_retention(tmp_path, clock):
+    queue = jobs.SQLiteJobQueue(str(tmp_path / "jobs.sqlite3"), retention_seconds=3600)
+    queue.enqueue("k", {}, "done", cost=5, client_id="a")
+    queue.enqueue("k", {}, "queued", cost=5, client_id="b")
+    queue.lease("w")
+    queue.complete("done", "w", {})
+
+    assert queue.prune() == 0
+    clock.advance(3601)
+    assert queue.prune() == 1
+    assert queue.get("done") is None and queue.get("queued")["status"] == QUEUED
+    assert queue.counts() == {QUEUED: 1}
+
+def test_finished_jobs_expire_in_redis(make_queue):
+    queue = make_queue()
+    if not isinstance(queue, jobs.RedisJobQueue):
+        pytest.skip("Redis keys expire; SQLite rows are pruned")
+    queue.retention_seconds = 3600
+    queue.enqueue("k", {}, "done", cost=1)
+    waiter = queue.enqueue("k", {}, "cancelled", cost=2)["waiter"]
+    queue.lease("w")
+    queue.complete("done", "w", {})
+    queue.release("cancelled", waiter)
+
+    for job_id in ("done", "cancelled"):
+        assert 0 < queue.redis.ttl(queue._key(job_id)) <= 3600
+        assert queue.redis.ttl(queue._waiters_key(job_id)) <= 3600
+    queue.enqueue("k", {}, "done")  # enqueued again: kept until it finishes
+    assert queue.redis.ttl(queue._key("done")) == -1
+
+def test_prune_drops_client_state_the_clock_has_passed(queue):
+    queue.enqueue("k", {}, "a", cost=5, client_id="a")
+    queue.enqueue("k", {}, "b", cost=10, client_id="b")
+    queue.lease("w")  # the virtual clock moves to a's finish time
+
+    queue.prune()
+    queue.enqueue("k", {}, "a2", cost=5, client_id="a")
+    assert queue.get("a2")["priority"] == 10.0
+    assert queue.get("b")["priority"] == 10.0
@@ -0,0 +1,80 @@
+"""Segment file format, time range lookups and subtitle export."""
+import pytest
+
+from services.segments import SegmentIndex, format_timestamp, iter_subtitles, write_segments
+
+SEGMENTS = [
+    {"start": 0.0, "end": 2.5, "text": " Hello there. "},
+    {"start": 2.5, "end": 5.0, "text": "Grüße, 世界"},
+    {"start": 5.0, "end": 7.0, "text": ""},
+    {"start": 7.0, "end": 9.9996, "text": "Last one"},
+]
+
+@pytest.fixture
+def path(tmp_path):
+    return write_segments(str(tmp_path / "video_segments.seg"), SEGMENTS, "de")
+
+def test_round_trip(path):
+    with SegmentIndex(path) as index:
+        assert len(index) == 4 and index.language == "de"
+        assert [index[i] for i in range(len(index))] == [
+            {"index": 0, "start": 0.0, "end": 2.5, "text": "Hello there."},
+            {"index": 1, "start": 2.5, "end": 5.0, "text": "Grüße, 世界"},
+            {"index": 2, "start": 5.0, "end": 7.0, "text": ""},
+            {"index": 3, "start": 7.0, "end": 10.0, "text": "Last one"},
+        ]
+        with pytest.raises(IndexError):
+            index[4]
+
+def test_find_returns_segments_overlapping_the_range(path):
+    with SegmentIndex(path) as index:
+        # Segments that only touch the range at its edges are left out
+        assert list(index.find(2.5, 7)) == [1, 2]
+        assert list(index.find(2.4, 7.1)) == [0, 1, 2, 3]
+        assert list(index.find(None, 0)) == []
+        assert list(index.find(None, 0.1)) == [0]
+        assert list(index.find(9, None)) == [3]
+        assert list(index.find(20, None)) == []
+        assert list(index.find()) == [0, 1, 2, 3]
+        assert list(index.find(6, 3)) == []
+
+def test_file_without_segments(tmp_path):
+    path = write_segments(str(tmp_path / "empty.seg"), [])
+    with SegmentIndex(path) as index:
+        assert len(index) == 0 and index.language == ""
+        assert list(index.find(0, 10)) == []
+    assert list(iter_subtitles(path, "vtt")) == ["WEBVTT\n\n"]
+
+def test_zero_byte_and_foreign_files_are_rejected(tmp_path):
+    empty = tmp_path / "zero.seg"
+    empty.write_bytes(b"")
+    with pytest.raises(ValueError, match="Empty segment file"):
+        SegmentIndex(str(empty))
+
+    foreign = tmp_path / "foreign.seg"
+    foreign.write_bytes(b"x" * 64)
+    with pytest.raises(ValueError, match="Not a segment file"):
+        SegmentIndex(str(foreign))
+
+@pytest.mark.parametrize("seconds, separator, expected", [
+    (0, ",", "00:00:00,000"),
+    (9.9996, ",", "00:00:10,000"),
+    (61.2344, ".", "00:01:01.234"),
+    (3599.9999, ".", "01:00:00.000"),
+    (36000.5, ",", "10:00:00,500"),
+])
+def test_format_timestamp_rounds_to_milliseconds(seconds, separator, expected):
+    assert format_timestamp(seconds, separator) == expected
+
+def test_srt_export(path):
+    assert "".join(iter_subtitles(path, "srt")).split("\n\n")[:2] == [
+        "1\n00:00:00,000 --> 00:00:02,500\nHello there.",
+        "2\n00:00:02,500 --> 00:00:05,000\nGrüße, 世界",
+    ]
+    assert "".join(iter_subtitles(path, "srt")).endswith("4\n00:00:07,000 --> 00:00:10,000\nLast one\n\n")
+
+def test_vtt_export(path):
+    cues = list(iter_subtitles(path, "vtt"))
+    assert cues[0] == "WEBVTT\nLanguage: de\n\n"
+    assert cues[1] == "00:00:00.000 --> 00:00:02.500\nHello there.\n\n"
+    assert len(cues) == 5
@@ -0,0 +1,33 @@
+"""
+Standalone queue worker.
+
+Runs pipeline jobs enqueued by API processes. Start as many as the hardware
+allows, on this machine or on others that share JOB_QUEUE_URL and OUTPUTS_DIR:
+
+    WORKER_CONCURRENCY=2 python worker.py
+"""
+import logging
+import signal
+import threading
+from dotenv import load_dotenv
+from services import runtime
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+
+    runtime.startup("worker")
+    stop.wait()
+
+    # Let running jobs finish so a deploy does not throw away their progress
+    logger.info("Shutting down, waiting for running jobs to finish...")
+    runtime.shutdown(wait=True)
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ export interface TranscriptRequest {
   youtube_url: string;
   model_size: string;
   target_language: string;
+  caption_policy?: 'off' | 'manual' | 'auto';
 }
 
 export interface TranscriptResponse {
@@ -13,6 +14,7 @@ export interface TranscriptResponse {
   detected_language: string;
   target_language: string;
   translated: boolean;
+  transcript_source: 'whisper' | 'captions' | 'duplicate';
   audio_path: string;
   transcript_path: string;
   notes_path: string;